@@ -1,2 +1,3 @@
-from .file_manager import *
-from .operations import *
\ No newline at end of file
+# Sin imports con efectos secundarios: importar el paquete no abre la BD.
+# Los workers del rescan paralelo (spawn) importan backend.match_parallel y no
+# deben tocar db.sqlite mientras el proceso principal tiene la escritura.
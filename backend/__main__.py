@@ -0,0 +1,61 @@
+import argparse
+import logging
+
+from backend import operations
+from backend import importacion
+
+# ——————————————————————————————
+# Comandos de mantenimiento: python -m backend <comando>
+# ——————————————————————————————
+def _compactar(args) -> int:
+    borradas = operations.compactar_utilizables(vacuum=args.vacuum)
+    if borradas is None:
+        print("Error compactando utilizables.")
+        return 1
+    print(f"Utilizables compactada: {borradas} filas eliminadas.")
+    return 0
+
+
+def _importar(args) -> int:
+    try:
+        r = importacion.importar_operaciones(args.archivo, formato=args.formato,
+                                             rechazos=args.rechazos, tipo=args.tipo)
+    except Exception as e:
+        logging.exception("Error importando operaciones")
+        print(f"Error importando {args.archivo}: {e}")
+        return 1
+    print(f"Importadas: {r['importadas']} ({r['envios']} envíos, {r['recepciones']} recepciones) "
+          f"en {r['segundos']} s.")
+    if r["matching"]:
+        print(f"Matching: {r['matching']['insertados']} utilizables nuevos.")
+    if r["rechazadas"]:
+        print(f"Rechazadas: {r['rechazadas']} (detalle en {r['rechazos']})")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend", description="Mantenimiento de GestorMatches")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    p = comandos.add_parser("compactar", help="Elimina utilizables cuyas operaciones ya no están DISPONIBLES")
+    p.add_argument("--vacuum", action="store_true", help="Ejecuta VACUUM al terminar")
+    p.set_defaults(func=_compactar)
+
+    p = comandos.add_parser(
+        "importar", help="Carga masiva de envíos y recepciones desde CSV o JSON Lines",
+        description="Carga masiva de envíos y recepciones. Si la app está abierta, toma los "
+                    "cambios sola en la próxima consulta (índice de matching, contador y países).",
+    )
+    p.add_argument("archivo", help="CSV con encabezado tipo,monto,paises[,fecha_hora] o JSON Lines con esas claves")
+    p.add_argument("--formato", choices=importacion.FORMATOS, help="Por defecto, según la extensión")
+    p.add_argument("--rechazos", help="Archivo de filas rechazadas (por defecto <archivo>.rechazos.csv)")
+    p.add_argument("--tipo", choices=list(importacion.TIPOS), help="Tipo para las filas sin columna tipo")
+    p.set_defaults(func=_importar)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
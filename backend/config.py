@@ -0,0 +1,38 @@
+import os
+
+# ——————————————————————————————
+# Configuración del backend
+# ——————————————————————————————
+# Cada valor puede sobreescribirse con una variable de entorno GESTOR_<NOMBRE>.
+
+# Motor del rescan completo de auto_match_pairings:
+#   "python" -> índice en memoria por país y monto
+#   "sql"    -> un único INSERT … SELECT resuelto dentro de SQLite
+MATCH_ENGINE = os.environ.get("GESTOR_MATCH_ENGINE", "python").lower()
+
+# Archivo de la base de datos compartida por todo el proceso
+DB_FILE = os.environ.get("GESTOR_DB_FILE", "db.sqlite")
+
+# Conexiones SQLite: espera ante bloqueos (ms), modo de sincronización
+# (OFF, NORMAL, FULL o EXTRA) y tamaño del pool de conexiones de sólo lectura
+BUSY_TIMEOUT_MS = int(os.environ.get("GESTOR_BUSY_TIMEOUT_MS", "5000"))
+SYNCHRONOUS = os.environ.get("GESTOR_SYNCHRONOUS", "NORMAL").upper()
+READER_POOL_SIZE = int(os.environ.get("GESTOR_READER_POOL_SIZE", "4"))
+
+# Filas por executemany en el rescan completo de auto_match_pairings
+MATCH_BATCH_SIZE = int(os.environ.get("GESTOR_MATCH_BATCH_SIZE", "5000"))
+
+# Núcleo del matching completo (auto_match_pairings y get_available_matches):
+#   "auto"   -> índice; NumPy (si está instalado) sólo para el rescan
+#               completo cuando la estimación de costo (envíos × recepciones ×
+#               ancho de máscara contra pares por envío) lo da por más barato
+#   "numpy"  -> arrays NumPy por bloques de envíos × recepciones
+#   "python" -> índice en memoria (búsqueda por rango + buckets/máscaras)
+MATCH_KERNEL = os.environ.get("GESTOR_MATCH_KERNEL", "auto").lower()
+# Tope de celdas (envíos × recepciones) por bloque del núcleo NumPy
+MATCH_KERNEL_CELDAS = int(os.environ.get("GESTOR_MATCH_KERNEL_CELDAS", "2000000"))
+
+# Rescan completo en paralelo: procesos worker (1 = sin paralelismo) y mínimo
+# de envíos DISPONIBLES para que valga la pena repartirlos
+MATCH_WORKERS = int(os.environ.get("GESTOR_MATCH_WORKERS", "1"))
+MATCH_PARALLEL_MIN = int(os.environ.get("GESTOR_MATCH_PARALLEL_MIN", "5000"))
@@ -0,0 +1,114 @@
+import logging
+import sys
+import threading
+
+from backend.db_manager import get_database
+
+# ——————————————————————————————
+# Catálogo de países en memoria
+# ——————————————————————————————
+def normalize_country(nombre: str) -> str:
+    """
+    Forma canónica de un país: sin espacios extremos, en mayúsculas e internada,
+    para que todas las operaciones con el mismo país compartan el mismo string.
+    """
+    return sys.intern(nombre.strip().upper())
+
+def firma_paises(paises) -> str:
+    """
+    Firma canónica de un conjunto de países: únicos, normalizados, ordenados
+    y unidos por coma. Dos operaciones tienen los mismos países si y sólo si
+    tienen la misma firma.
+    """
+    return ",".join(sorted({normalize_country(p) for p in paises if p.strip()}))
+
+
+class CountryCatalogue:
+    """
+    Copia en memoria de la tabla `paises`. Se carga una única vez y se
+    actualiza write-through: cada alta se escribe en la BD y en memoria.
+
+    Además asigna a cada país una posición de bit estable (orden de alta en
+    `paises`; los países que sólo aparecen en operaciones van a continuación),
+    para representar conjuntos de países como máscaras enteras.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._nombres = None   # lista en orden de alta (id)
+        self._conjunto = set()
+        # Lock propio: el índice de matching pide bits con el lock de escritura tomado
+        self._bits_lock = threading.Lock()
+        self._bits = {}        # país -> posición de bit; nunca se reasigna
+
+    def _cargar(self):
+        with get_database().reader() as conn:
+            filas = conn.execute("SELECT nombre FROM paises ORDER BY id").fetchall()
+        self._nombres = [normalize_country(r["nombre"]) for r in filas]
+        self._conjunto = set(self._nombres)
+        logging.debug(f"Catálogo de países cargado: {len(self._nombres)} países.")
+
+    def nombres(self) -> list:
+        """Países disponibles, en orden de alta."""
+        with self._lock:
+            if self._nombres is None:
+                self._cargar()
+            return list(self._nombres)
+
+    def __contains__(self, nombre: str) -> bool:
+        with self._lock:
+            if self._nombres is None:
+                self._cargar()
+            return normalize_country(nombre) in self._conjunto
+
+    def add(self, nombre: str) -> bool:
+        """
+        Agrega un país (si no existía) en la BD y en el catálogo.
+        Devuelve True si era nuevo.
+        """
+        nombre = normalize_country(nombre)
+        if not nombre:
+            return False
+        with self._lock:
+            if self._nombres is None:
+                self._cargar()
+            if nombre in self._conjunto:
+                return False
+            with get_database().writer() as conn:
+                conn.execute("INSERT OR IGNORE INTO paises (nombre) VALUES (?)", (nombre,))
+                conn.commit()
+            self._nombres.append(nombre)
+            self._conjunto.add(nombre)
+        self.bit(nombre)
+        return True
+
+    def bit(self, nombre: str) -> int:
+        """Posición de bit del país (se asigna la siguiente libre si es nuevo)."""
+        nombre = normalize_country(nombre)
+        with self._bits_lock:
+            if not self._bits:
+                with get_database().reader() as conn:
+                    filas = conn.execute("SELECT nombre FROM paises ORDER BY id").fetchall()
+                for r in filas:
+                    self._bits.setdefault(normalize_country(r["nombre"]), len(self._bits))
+            return self._bits.setdefault(nombre, len(self._bits))
+
+    def mascara(self, paises) -> int:
+        """Conjunto de países como entero: un bit encendido por país."""
+        m = 0
+        for p in paises:
+            m |= 1 << self.bit(p)
+        return m
+
+    def invalidate(self):
+        """
+        Descarta la copia en memoria; se recarga en el próximo acceso.
+        Las posiciones de bit se conservan para no invalidar máscaras ya calculadas.
+        """
+        with self._lock:
+            self._nombres = None
+            self._conjunto = set()
+
+
+# Catálogo compartido por file_manager, operations y el matching
+catalogue = CountryCatalogue()
@@ -1,12 +1,246 @@
 import sqlite3
 import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from backend import config
+
+# ——————————————————————————————
+# Migraciones de esquema (PRAGMA user_version)
+# ——————————————————————————————
+def _migracion_1(cur):
+    """Índices secundarios para búsquedas por operación, país, monto y fecha."""
+    indices = [
+        "CREATE INDEX IF NOT EXISTS idx_envio_paises_envio ON envio_paises(envio_id)",
+        "CREATE INDEX IF NOT EXISTS idx_envio_paises_pais ON envio_paises(pais)",
+        "CREATE INDEX IF NOT EXISTS idx_recepcion_paises_recepcion ON recepcion_paises(recepcion_id)",
+        "CREATE INDEX IF NOT EXISTS idx_recepcion_paises_pais ON recepcion_paises(pais)",
+        "CREATE INDEX IF NOT EXISTS idx_envios_monto ON envios(monto)",
+        "CREATE INDEX IF NOT EXISTS idx_envios_fecha ON envios(fecha_hora)",
+        "CREATE INDEX IF NOT EXISTS idx_recepciones_monto ON recepciones(monto)",
+        "CREATE INDEX IF NOT EXISTS idx_recepciones_fecha ON recepciones(fecha_hora)",
+        "CREATE INDEX IF NOT EXISTS idx_utilizables_recepcion ON utilizables(recepcion_id)",
+        "CREATE INDEX IF NOT EXISTS idx_pendientes_par ON pendientes(envio_id, recepcion_id)",
+        "CREATE INDEX IF NOT EXISTS idx_concluidas_fecha ON concluidas(fecha_hora)",
+    ]
+    for sql in indices:
+        cur.execute(sql)
+
+def _tiene_columna(cur, tabla: str, columna: str) -> bool:
+    return any(r[1] == columna for r in cur.execute(f"PRAGMA table_info({tabla})").fetchall())
+
+def _migracion_2(cur):
+    """
+    Firma canónica de países (paises_firma) en envíos y recepciones para que la
+    detección de duplicados sea una única búsqueda indexada por (monto, firma).
+    """
+    from backend.countries import firma_paises
+
+    for tabla, tabla_paises, fk in (("envios", "envio_paises", "envio_id"),
+                                    ("recepciones", "recepcion_paises", "recepcion_id")):
+        if not _tiene_columna(cur, tabla, "paises_firma"):
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN paises_firma TEXT NOT NULL DEFAULT ''")
+        # Backfill de las filas existentes
+        paises = {}
+        for op_id, pais in cur.execute(f"SELECT {fk}, pais FROM {tabla_paises}").fetchall():
+            paises.setdefault(op_id, []).append(pais)
+        cur.executemany(
+            f"UPDATE {tabla} SET paises_firma = ? WHERE id = ?",
+            [(firma_paises(lista), op_id) for op_id, lista in paises.items()]
+        )
+        cur.execute(f"DROP INDEX IF EXISTS idx_{tabla}_monto")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_monto_firma ON {tabla}(monto, paises_firma)")
+
+def _sql_paises(tabla_paises: str, fk: str, op_id: str) -> tuple:
+    """
+    Expresiones SQL que recalculan, para la operación `op_id`, la lista de
+    países (únicos, en orden de carga) y la firma (únicos y ordenados).
+    """
+    paises = (
+        f"(SELECT coalesce(group_concat(pais, ','), '') FROM ("
+        f"SELECT pais FROM {tabla_paises} WHERE {fk} = {op_id} GROUP BY pais ORDER BY min(rowid)))"
+    )
+    firma = (
+        f"(SELECT coalesce(group_concat(pais, ','), '') FROM ("
+        f"SELECT DISTINCT pais FROM {tabla_paises} WHERE {fk} = {op_id} ORDER BY pais))"
+    )
+    return paises, firma
+
+def _migracion_3(cur):
+    """
+    Columna `paises` (lista de países ya concatenada) en envíos y recepciones.
+    Triggers sobre las tablas de países mantienen `paises` y `paises_firma`
+    al día, así las lecturas no necesitan el join con *_paises.
+    """
+    for tabla, tabla_paises, fk in (("envios", "envio_paises", "envio_id"),
+                                    ("recepciones", "recepcion_paises", "recepcion_id")):
+        if not _tiene_columna(cur, tabla, "paises"):
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN paises TEXT NOT NULL DEFAULT ''")
+        # Backfill de las filas existentes (la firma ya la calculó la migración 2)
+        paises, _ = _sql_paises(tabla_paises, fk, f"{tabla}.id")
+        cur.execute(f"UPDATE {tabla} SET paises = {paises}")
+
+        for evento, refs in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+            cuerpo = ""
+            for ref in refs:
+                paises, firma = _sql_paises(tabla_paises, fk, f"{ref}.{fk}")
+                cuerpo += (
+                    f"UPDATE {tabla} SET paises = {paises}, paises_firma = {firma} "
+                    f"WHERE id = {ref}.{fk};\n"
+                )
+            cur.execute(f"DROP TRIGGER IF EXISTS trg_{tabla_paises}_{evento.lower()}")
+            cur.execute(
+                f"CREATE TRIGGER trg_{tabla_paises}_{evento.lower()} "
+                f"AFTER {evento} ON {tabla_paises} FOR EACH ROW BEGIN\n{cuerpo}END"
+            )
+
+def _migracion_4(cur):
+    """
+    Versión de datos por mes (`reporte_versiones`, clave 'AAAA-MM'). Triggers la
+    incrementan cuando una escritura toca filas fechadas en ese mes, así la caché
+    de reportes sabe si un mes cambió sin volver a consultarlo.
+    """
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS reporte_versiones ("
+        "mes TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+    )
+    # Los triggers buscan los concluidos de una operación
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_concluidas_envio ON concluidas(envio_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_concluidas_recepcion ON concluidas(recepcion_id)")
+
+    def subir(ref):
+        return (f"INSERT INTO reporte_versiones (mes, version) VALUES (substr({ref}.fecha_hora, 1, 7), 1) "
+                f"ON CONFLICT(mes) DO UPDATE SET version = version + 1;\n")
+
+    def subir_concluidas(fk, ref):
+        # Los concluidos muestran los países de sus operaciones, que pueden ser de otro mes
+        return (f"INSERT INTO reporte_versiones (mes, version) "
+                f"SELECT substr(fecha_hora, 1, 7), 1 FROM concluidas WHERE {fk} = {ref}.id "
+                f"ON CONFLICT(mes) DO UPDATE SET version = version + 1;\n")
+
+    triggers = {"concluidas": (("INSERT", "", subir("NEW")),
+                               ("DELETE", "", subir("OLD")),
+                               ("UPDATE", "", subir("OLD") + subir("NEW")))}
+    for tabla, fk in (("envios", "envio_id"), ("recepciones", "recepcion_id")):
+        # Cambios de estado no alteran el reporte: sólo las columnas que se muestran
+        triggers[tabla] = (("INSERT", "", subir("NEW")),
+                           ("DELETE", "", subir("OLD") + subir_concluidas(fk, "OLD")),
+                           ("UPDATE", " OF monto, fecha_hora, paises",
+                            subir("OLD") + subir("NEW") + subir_concluidas(fk, "NEW")))
+    for tabla, eventos in triggers.items():
+        for evento, columnas, cuerpo in eventos:
+            nombre = f"trg_{tabla}_version_{evento.lower()}"
+            cur.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            cur.execute(
+                f"CREATE TRIGGER {nombre} AFTER {evento}{columnas} ON {tabla} "
+                f"FOR EACH ROW BEGIN\n{cuerpo}END"
+            )
+
+# Versión -> función que lleva el esquema desde la versión anterior a ésta.
+# Para agregar una migración basta con sumar una entrada con el número siguiente.
+MIGRACIONES = {
+    1: _migracion_1,
+    2: _migracion_2,
+    3: _migracion_3,
+    4: _migracion_4,
+}
+SCHEMA_VERSION = max(MIGRACIONES)
+
+
+SYNCHRONOUS_VALIDOS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
 
 class DatabaseManager:
-    def __init__(self, db_file="db.sqlite"):
-        # Conecta (o crea) la BD
-        self.conn = sqlite3.connect(db_file, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+    """
+    Conexiones a la BD: una única conexión de escritura (self.conn), serializada
+    con un lock, y un pool pequeño de conexiones de sólo lectura. La BD trabaja
+    en modo WAL, así que las lecturas no se bloquean con la escritura en curso.
+    """
+
+    def __init__(self, db_file="db.sqlite", busy_timeout_ms=None, synchronous=None, readers=None):
+        self.db_file = db_file
+        self.busy_timeout_ms = config.BUSY_TIMEOUT_MS if busy_timeout_ms is None else busy_timeout_ms
+        self.synchronous = (synchronous or config.SYNCHRONOUS).upper()
+        if self.synchronous not in SYNCHRONOUS_VALIDOS:
+            logging.warning(f"synchronous inválido '{self.synchronous}', se usa NORMAL.")
+            self.synchronous = "NORMAL"
+        self.pool_size = max(1, config.READER_POOL_SIZE if readers is None else readers)
+        self._write_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._readers_creados = 0
+        self._readers_lock = threading.Lock()
+        self._data_version = None   # último PRAGMA data_version visto por self.conn
+
+        # Conecta (o crea) la BD con la conexión de escritura
+        self.conn = self._connect()
+        try:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        except Exception:
+            logging.exception("No se pudo activar el modo WAL")
         self.create_tables()
+        # Punto de partida para detectar escrituras de otros procesos
+        self.cambio_externo()
+
+    def _connect(self, readonly: bool = False):
+        conn = sqlite3.connect(
+            self.db_file, check_same_thread=False, timeout=self.busy_timeout_ms / 1000
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """
+        Conexión de escritura con acceso exclusivo (reentrante).
+        Si el bloque lanza una excepción se hace rollback de lo no confirmado.
+        """
+        with self._write_lock:
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def cambio_externo(self) -> bool:
+        """
+        True si otra conexión (por ejemplo `python -m backend importar` con la
+        app abierta) confirmó cambios desde la llamada anterior. Compara el
+        PRAGMA data_version de la conexión de escritura, que sólo cambia con
+        escrituras ajenas a ella.
+        """
+        with self._write_lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            cambio = self._data_version is not None and version != self._data_version
+            self._data_version = version
+            return cambio
+
+    @contextmanager
+    def reader(self):
+        """
+        Toma prestada una conexión de sólo lectura del pool. Se crean a demanda
+        hasta `pool_size`; si están todas en uso se espera a que vuelva una.
+        """
+        conn = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._readers_lock:
+                if self._readers_creados < self.pool_size:
+                    self._readers_creados += 1
+                    conn = self._connect(readonly=True)
+            if conn is None:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
 
     def create_tables(self):
         cur = self.conn.cursor()
@@ -133,10 +367,54 @@ class DatabaseManager:
             logging.exception("Error insertando valores predeterminados en 'paises'")
 
         self.conn.commit()
+        self.migrate()
+
+    def migrate(self):
+        """
+        Aplica en orden las migraciones pendientes según PRAGMA user_version,
+        de modo que un db.sqlite existente se actualice al iniciar.
+        Cada migración corre en su propia transacción junto con el cambio de versión.
+        """
+        cur = self.conn.cursor()
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        for nueva in range(version + 1, SCHEMA_VERSION + 1):
+            try:
+                cur.execute("BEGIN")
+                MIGRACIONES[nueva](cur)
+                cur.execute(f"PRAGMA user_version = {nueva}")
+                self.conn.commit()
+                logging.info(f"Esquema migrado a la versión {nueva}.")
+            except Exception:
+                self.conn.rollback()
+                logging.exception(f"Error aplicando la migración {nueva}")
+                break
 
     def close(self):
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
         self.conn.close()
-        
+
+
+# ——————————————————————————————
+# Proveedor de conexiones del proceso
+# ——————————————————————————————
+_shared_db = None
+_shared_lock = threading.Lock()
+
+def get_database() -> DatabaseManager:
+    """
+    Devuelve el DatabaseManager compartido por todo el proceso (se crea una
+    única vez, con la configuración de backend.config).
+    """
+    global _shared_db
+    with _shared_lock:
+        if _shared_db is None:
+            _shared_db = DatabaseManager(config.DB_FILE)
+        return _shared_db
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
@@ -0,0 +1,20 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# ——————————————————————————————
+# Ejecutor de trabajo de base de datos
+# ——————————————————————————————
+# Un único hilo dedicado: todas las consultas y escrituras se serializan en él,
+# fuera del hilo principal de Kivy.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+def submit(fn, *args, **kwargs):
+    """Encola `fn(*args, **kwargs)` en el hilo de BD y devuelve su Future."""
+    return _executor.submit(fn, *args, **kwargs)
+
+def shutdown(wait: bool = True):
+    """Detiene el hilo de BD esperando a que termine lo encolado."""
+    try:
+        _executor.shutdown(wait=wait)
+    except Exception:
+        logging.exception("Error deteniendo el hilo de BD")
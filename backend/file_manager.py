@@ -1,9 +1,10 @@
 import logging
 from datetime import datetime
-from backend.db_manager import DatabaseManager
+from backend.db_manager import get_database
+from backend.countries import catalogue, normalize_country
 
-# Creamos una instancia global de DatabaseManager
-db = DatabaseManager()
+# Usamos las mismas conexiones que backend.operations (una sola configuración por proceso)
+db = get_database()
 
 def current_datetime():
     try:
@@ -16,28 +17,24 @@ def split_countries(countries_str: str) -> str:
     if not countries_str.strip():
         return ""
     # Convierte cada país a mayúsculas y elimina espacios extras
-    countries = [p.strip().upper() for p in countries_str.split(',') if p.strip()]
+    countries = [normalize_country(p) for p in countries_str.split(',') if p.strip()]
     return ','.join(countries)
 
 def load_available_countries():
+    # Catálogo en memoria: sólo consulta la BD la primera vez (o si otro
+    # proceso la cambió, p. ej. una importación por CLI)
+    from backend.operations import sincronizar_cambios_externos
     try:
-        cur = db.conn.cursor()
-        cur.execute("SELECT nombre FROM paises")
-        rows = cur.fetchall()
-        return [row["nombre"] for row in rows]
+        sincronizar_cambios_externos()
+        return catalogue.nombres()
     except Exception as e:
         logging.exception("Error al cargar países")
         return []
 
 def add_new_country(country: str):
     try:
-        countries = load_available_countries()
-        country = country.upper().strip()
-        if country not in countries:
-            cur = db.conn.cursor()
-            cur.execute("INSERT INTO paises (nombre) VALUES (?)", (country,))
-            db.conn.commit()
-            logging.info(f"Nuevo país agregado: {country}")
+        if catalogue.add(country):
+            logging.info(f"Nuevo país agregado: {normalize_country(country)}")
         return load_available_countries()
     except Exception as e:
         logging.exception("Error al agregar nuevo país")
@@ -0,0 +1,243 @@
+import csv
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime
+
+from backend.countries import catalogue, firma_paises
+from backend.operations import (
+    db, match_index, auto_match_pairings, current_datetime, split_countries_list,
+)
+
+# ——————————————————————————————
+# Importación masiva de envíos y recepciones (CSV / JSON Lines)
+# ——————————————————————————————
+# Filas por transacción: cada lote es un executemany de operaciones y otro de países
+LOTE_IMPORTACION = 5000
+FORMATOS = ("csv", "jsonl")
+TIPOS = {"envio": "envios", "recepcion": "recepciones"}
+# Tabla de países y FK de cada tabla de operaciones
+_PAISES = {"envios": ("envio_paises", "envio_id"), "recepciones": ("recepcion_paises", "recepcion_id")}
+
+
+class FilaInvalida(Exception):
+    """La fila no se puede importar; el mensaje es el motivo del rechazo."""
+
+
+def _formato_de(ruta: str) -> str:
+    extension = os.path.splitext(ruta)[1].lower()
+    return "jsonl" if extension in (".jsonl", ".json", ".ndjson") else "csv"
+
+
+def _leer_filas(archivo, formato: str):
+    """Genera (número de línea, dict, texto original) sin cargar el archivo entero."""
+    if formato == "csv":
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila, None
+        return
+    for numero, linea in enumerate(archivo, start=1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            yield numero, None, linea.rstrip("\n")
+            continue
+        yield numero, fila, linea.rstrip("\n")
+
+
+def _paises_de(valor, cache: dict = None) -> tuple:
+    """
+    (países, firma) de la columna paises: texto separado por comas o lista
+    de textos. Sin repetir países, conservando el orden en que vienen.
+    `cache` guarda el resultado por valor original: en un archivo grande se
+    repiten pocas combinaciones de países.
+    """
+    if isinstance(valor, list):
+        if any(not isinstance(p, str) or not p.strip() for p in valor):
+            raise FilaInvalida(f"paises inválido: {valor!r} (cada país debe ser un texto no vacío)")
+        clave = tuple(valor)
+    elif isinstance(valor, str) or valor is None:
+        clave = valor or ""
+    else:
+        raise FilaInvalida(f"paises inválido: {valor!r} (se espera texto separado por comas o lista)")
+    if cache is not None and clave in cache:
+        return cache[clave]
+    texto = ",".join(clave) if isinstance(clave, tuple) else clave
+    paises = tuple(dict.fromkeys(split_countries_list(texto)))
+    resultado = (paises, firma_paises(paises))
+    if cache is not None:
+        cache[clave] = resultado
+    return resultado
+
+
+def _validar(fila, tipo_por_defecto: str = None, cache: dict = None) -> tuple:
+    """
+    Normaliza una fila leída a (tabla, monto, fecha_hora, países, firma).
+    Columnas: tipo (envio/recepcion), monto, paises (texto separado por
+    comas o lista) y, opcional, fecha_hora (AAAA-MM-DD HH:MM:SS).
+    """
+    if not isinstance(fila, dict):
+        raise FilaInvalida("la línea no es un objeto JSON")
+    fila = {str(k).strip().lower(): v for k, v in fila.items() if k is not None}
+
+    tipo = str(fila.get("tipo") or tipo_por_defecto or "").strip().lower()
+    tabla = TIPOS.get(tipo) or (tipo if tipo in TIPOS.values() else None)
+    if not tabla:
+        raise FilaInvalida(f"tipo inválido: '{tipo}' (se espera envio o recepcion)")
+
+    monto = fila.get("monto")
+    try:
+        # Mismo criterio que los formularios: la coma es separador de miles
+        monto = float(monto.replace(",", "")) if isinstance(monto, str) else float(monto)
+    except (TypeError, ValueError):
+        raise FilaInvalida(f"monto inválido: '{fila.get('monto')}'")
+    if not math.isfinite(monto) or monto < 0:
+        raise FilaInvalida(f"monto inválido: '{fila.get('monto')}'")
+
+    fecha = str(fila.get("fecha_hora") or "").strip()
+    if fecha:
+        try:
+            # Se guarda normalizada ("2025-3-5 1:2:3" -> "2025-03-05 01:02:03"):
+            # los reportes filtran por prefijo AAAA-MM
+            fecha = datetime.strptime(fecha, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            raise FilaInvalida(f"fecha_hora inválida: '{fecha}' (se espera AAAA-MM-DD HH:MM:SS)")
+    # Los países al final: lo que queda en `cache` es de filas válidas
+    paises, firma = _paises_de(fila.get("paises"), cache)
+    if not paises:
+        raise FilaInvalida("sin países")
+    return tabla, monto, fecha or None, paises, firma
+
+
+def _siguiente_id(cur, tabla: str) -> int:
+    """Próximo id AUTOINCREMENT de la tabla (ids explícitos para executemany)."""
+    return cur.execute(
+        "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0), "
+        f"COALESCE((SELECT MAX(id) FROM {tabla}), 0)) + 1",
+        (tabla,)
+    ).fetchone()[0]
+
+
+def _insertar_lote(lote: list, fecha: str) -> dict:
+    """
+    Inserta el lote en una única transacción, con un executemany por tabla.
+    Los países se insertan antes que su operación: así los triggers de
+    *_paises no encuentran fila que actualizar y no recalculan nada por país;
+    paises y paises_firma se escriben ya calculados (mismo resultado que los
+    triggers: orden de aparición y firma ordenada).
+    """
+    insertadas = {"envios": 0, "recepciones": 0}
+    with db.writer() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN")
+            for tabla, (tabla_paises, fk) in _PAISES.items():
+                filas = [f for f in lote if f[0] == tabla]
+                if not filas:
+                    continue
+                primero = _siguiente_id(cur, tabla)
+                cur.executemany(
+                    f"INSERT INTO {tabla_paises} ({fk}, pais) VALUES (?, ?)",
+                    [(primero + i, pais) for i, fila in enumerate(filas) for pais in fila[3]]
+                )
+                cur.executemany(
+                    f"INSERT INTO {tabla} (id, monto, estado, fecha_hora, paises, paises_firma) "
+                    f"VALUES (?, ?, 'DISPONIBLE', ?, ?, ?)",
+                    [(primero + i, monto, fecha_hora or fecha, ",".join(paises), firma)
+                     for i, (_, monto, fecha_hora, paises, firma) in enumerate(filas)]
+                )
+                insertadas[tabla] = len(filas)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return insertadas
+
+
+def importar_operaciones(ruta: str, formato: str = None, rechazos: str = None,
+                         tipo: str = None, lote: int = None) -> dict:
+    """
+    Importa envíos y recepciones desde un CSV (con encabezado) o JSON Lines,
+    leyendo el archivo de a `lote` filas (por defecto LOTE_IMPORTACION) e
+    insertando cada lote en una transacción. Las filas inválidas se escriben
+    en `rechazos` (por defecto <ruta>.rechazos.csv) con su línea y el motivo.
+    `tipo` se usa para las filas sin columna tipo.
+
+    El matching no corre por fila: al terminar se recarga el índice y se hace
+    una única pasada completa de auto_match_pairings.
+    Devuelve {"importadas", "envios", "recepciones", "rechazadas",
+    "rechazos", "segundos", "matching"}.
+    """
+    formato = (formato or _formato_de(ruta)).lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    rechazos = rechazos or f"{ruta}.rechazos.csv"
+    lote_max = lote or LOTE_IMPORTACION
+    fecha = current_datetime()
+    resultado = {"importadas": 0, "envios": 0, "recepciones": 0, "rechazadas": 0, "rechazos": None}
+    inicio = time.perf_counter()
+    cache_paises = {}
+
+    archivo_rechazos = None
+    try:
+        with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+            pendientes = []
+            for numero, fila, original in _leer_filas(archivo, formato):
+                try:
+                    valida = _validar(fila, tipo, cache_paises)
+                except FilaInvalida as e:
+                    if archivo_rechazos is None:
+                        archivo_rechazos = open(rechazos, "w", newline="", encoding="utf-8")
+                        escritor = csv.writer(archivo_rechazos)
+                        escritor.writerow(["linea", "motivo", "fila"])
+                    texto = original if original is not None else json.dumps(fila, ensure_ascii=False)
+                    escritor.writerow([numero, str(e), texto])
+                    resultado["rechazadas"] += 1
+                    continue
+                pendientes.append(valida)
+                if len(pendientes) >= lote_max:
+                    for tabla, n in _insertar_lote(pendientes, fecha).items():
+                        resultado[tabla] += n
+                    pendientes = []
+            if pendientes:
+                for tabla, n in _insertar_lote(pendientes, fecha).items():
+                    resultado[tabla] += n
+    finally:
+        if archivo_rechazos is not None:
+            archivo_rechazos.close()
+            resultado["rechazos"] = os.path.abspath(rechazos)
+
+    resultado["importadas"] = resultado["envios"] + resultado["recepciones"]
+    if resultado["importadas"]:
+        # Países nuevos al catálogo (como al agregarlos desde el formulario);
+        # el cache tiene todas las combinaciones de países importadas
+        for pais in sorted({p for paises, _ in cache_paises.values() for p in paises}):
+            if pais not in catalogue:
+                catalogue.add(pais)
+        # Índice recargado de una vez y una sola pasada de matching
+        with db.writer() as conn:
+            if match_index.loaded:
+                match_index.load(conn)
+        resultado["matching"] = auto_match_pairings()
+    else:
+        resultado["matching"] = None
+    resultado["segundos"] = round(time.perf_counter() - inicio, 2)
+    logging.info(f"Importación de {ruta}: {resultado}")
+    return resultado
+
+
+def importar_operaciones_ui(ruta: str) -> str:
+    try:
+        r = importar_operaciones(ruta)
+        texto = (f"{r['importadas']} operaciones importadas "
+                 f"({r['envios']} envíos, {r['recepciones']} recepciones) en {r['segundos']} s.")
+        if r["rechazadas"]:
+            texto += f"\n{r['rechazadas']} filas rechazadas, detalle en: {r['rechazos']}"
+        return texto
+    except Exception:
+        logging.exception("Error en importar_operaciones_ui")
+        return "Error al importar el archivo."
@@ -0,0 +1,337 @@
+import bisect
+import heapq
+import logging
+import threading
+from collections import defaultdict
+
+from backend.countries import catalogue, normalize_country
+
+# ——————————————————————————————
+# Regla de monto (60–140% o ±10000)
+# ——————————————————————————————
+RATIO_MIN = 0.6
+RATIO_MAX = 1.4
+DIFF_MAX = 10000
+
+def monto_compatible(monto_e: float, monto_r: float) -> bool:
+    """
+    Filtro de monto entre un envío y una recepción:
+    ratio 0.6–1.4 OR diferencia <= 10000.
+    """
+    ratio = monto_r / monto_e if monto_e else 0
+    diff = abs(monto_e - monto_r)
+    return (RATIO_MIN <= ratio <= RATIO_MAX) or (diff <= DIFF_MAX)
+
+def _ampliar(lo: float, hi: float) -> tuple:
+    # Margen para errores de redondeo; el filtro exacto se aplica después
+    return lo - abs(lo) * 1e-9 - 1e-9, hi + abs(hi) * 1e-9 + 1e-9
+
+def rango_recepciones(monto_e: float) -> tuple:
+    """
+    Intervalo [lo, hi] de montos de recepción que pueden calificar con un envío
+    de monto `monto_e`. Las dos condiciones de la regla contienen a `monto_e`,
+    así que su unión es un único intervalo contiguo.
+    """
+    extremos = (monto_e * RATIO_MIN, monto_e * RATIO_MAX)
+    return _ampliar(min(*extremos, monto_e - DIFF_MAX), max(*extremos, monto_e + DIFF_MAX))
+
+def rango_envios(monto_r: float) -> tuple:
+    """
+    Intervalo [lo, hi] de montos de envío que pueden calificar con una recepción
+    de monto `monto_r` (inverso de rango_recepciones).
+    """
+    extremos = (monto_r / RATIO_MAX, monto_r / RATIO_MIN)
+    return _ampliar(min(*extremos, monto_r - DIFF_MAX), max(*extremos, monto_r + DIFF_MAX))
+
+# ——————————————————————————————
+# Ranking de candidatas
+# ——————————————————————————————
+def puntaje(envio: dict, recepcion: dict) -> tuple:
+    """
+    Clave de orden de una candidata para un envío (menor = mejor):
+    1) diferencia relativa de monto, en pasos de 1%;
+    2) más países en común (bits compartidos de las máscaras);
+    3) la operación más antigua primero;
+    4) el ID, para que el orden sea estable y total.
+    """
+    me, mr = envio["monto"], recepcion["monto"]
+    base = max(abs(me), abs(mr))
+    dif_rel = abs(me - mr) / base if base else 0.0
+    comunes = (envio["mascara"] & recepcion["mascara"]).bit_count()
+    return (round(dif_rel, 2), -comunes, recepcion.get("fecha_hora") or "", recepcion["id"])
+
+def mejores_candidatas(envio: dict, candidatas: list, k: int) -> list:
+    """Las `k` mejores candidatas según puntaje(), con un heap acotado: O(R log k)."""
+    return heapq.nsmallest(k, candidatas, key=lambda r: puntaje(envio, r))
+
+# ——————————————————————————————
+# Índice en memoria de operaciones DISPONIBLES
+# ——————————————————————————————
+# Tablas por tipo de operación: (tabla principal, tabla de países, columna FK)
+TABLAS = {
+    "envio":     ("envios",      "envio_paises",     "envio_id"),
+    "recepcion": ("recepciones", "recepcion_paises", "recepcion_id"),
+}
+
+def _paises_de(fila: dict) -> set:
+    # La firma (mantenida por triggers) ya trae los países únicos y normalizados
+    return {normalize_country(p) for p in fila["paises_firma"].split(",") if p}
+
+
+class MatchIndex:
+    """
+    Mantiene en memoria los envíos y recepciones DISPONIBLES con su conjunto
+    de países ya cargado, en dos vistas ordenadas por (monto, id):
+    - un bucket por país con las operaciones que lo incluyen;
+    - una lista única con la máscara de países de cada operación en paralelo
+      (un bit por país, ver CountryCatalogue.mascara).
+    La regla de monto se resuelve con una búsqueda por rango (bisect). Para el
+    filtro de país se usa la vista más barata: unir los buckets de los países
+    de la operación o hacer un AND entero sobre las máscaras de todo el rango.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        # tipo -> {id: dict(fila) con claves extra 'paises' (frozenset) y 'mascara' (int)}
+        self.ops = {"envio": {}, "recepcion": {}}
+        # tipo -> {pais: [(monto, id), ...] ordenada}
+        self.buckets = {"envio": defaultdict(list), "recepcion": defaultdict(list)}
+        # tipo -> [(monto, id), ...] ordenada, y las máscaras en el mismo orden
+        self.claves = {"envio": [], "recepcion": []}
+        self.mascaras = {"envio": [], "recepcion": []}
+        # Contador del badge: recepciones candidatas por envío y cuántos envíos tienen alguna
+        self.candidatas_por_envio = {}
+        self.envios_con_candidatas = 0
+
+    # ——— Carga ———
+    def load(self, conn):
+        with self._lock:
+            self.ops = {"envio": {}, "recepcion": {}}
+            self.buckets = {"envio": defaultdict(list), "recepcion": defaultdict(list)}
+            self.claves = {"envio": [], "recepcion": []}
+            self.mascaras = {"envio": [], "recepcion": []}
+            self.candidatas_por_envio = {}
+            self.envios_con_candidatas = 0
+            cur = conn.cursor()
+            for tipo, (tabla, _, _) in TABLAS.items():
+                cur.execute(f"SELECT * FROM {tabla} WHERE estado='DISPONIBLE'")
+                filas = []
+                for r in cur.fetchall():
+                    fila = dict(r)
+                    self._describir(fila, _paises_de(fila))
+                    filas.append(fila)
+                self.cargar_filas(tipo, filas)
+            # Con ambos lados cargados se calcula el contador una sola vez
+            for e in self.ops["envio"].values():
+                self._set_candidatas(e["id"], len(self.recepciones_para(e)))
+            self.loaded = True
+            logging.debug(
+                f"MatchIndex cargado: {len(self.ops['envio'])} envíos, "
+                f"{len(self.ops['recepcion'])} recepciones."
+            )
+
+    def cargar_filas(self, tipo: str, filas: list):
+        """
+        Indexa de una vez filas ya descritas (con 'paises' y 'mascara'), sin
+        tocar la BD. Lo usan load() y los workers del rescan paralelo.
+        """
+        with self._lock:
+            for f in filas:
+                self.ops[tipo][f["id"]] = f
+            # Orden por monto construido de una vez, sin inserciones una a una
+            filas = sorted(filas, key=lambda f: (f["monto"], f["id"]))
+            self.claves[tipo] = [(f["monto"], f["id"]) for f in filas]
+            self.mascaras[tipo] = [f["mascara"] for f in filas]
+            for f in filas:
+                for pais in f["paises"]:
+                    self.buckets[tipo][pais].append((f["monto"], f["id"]))
+
+    # ——— Mantenimiento ———
+    def _describir(self, fila: dict, paises):
+        fila["paises"] = frozenset(paises)
+        fila["mascara"] = catalogue.mascara(fila["paises"])
+
+    def _indexar(self, tipo: str, fila: dict, paises):
+        self._describir(fila, paises)
+        self.ops[tipo][fila["id"]] = fila
+        clave = (fila["monto"], fila["id"])
+        for pais in fila["paises"]:
+            bisect.insort(self.buckets[tipo][pais], clave)
+        i = bisect.bisect_left(self.claves[tipo], clave)
+        self.claves[tipo].insert(i, clave)
+        self.mascaras[tipo].insert(i, fila["mascara"])
+
+    def _set_candidatas(self, envio_id: int, cantidad: int):
+        antes = self.candidatas_por_envio.get(envio_id, 0)
+        if cantidad:
+            self.candidatas_por_envio[envio_id] = cantidad
+        else:
+            self.candidatas_por_envio.pop(envio_id, None)
+        self.envios_con_candidatas += (cantidad > 0) - (antes > 0)
+
+    def _add(self, tipo: str, fila: dict, paises):
+        self._indexar(tipo, fila, paises)
+        # Mantener el contador del badge sólo con los pares afectados
+        if tipo == "envio":
+            self._set_candidatas(fila["id"], len(self.recepciones_para(fila)))
+        else:
+            for e in self.envios_para(fila):
+                self._set_candidatas(e["id"], self.candidatas_por_envio.get(e["id"], 0) + 1)
+
+    def _remove(self, tipo: str, op_id: int):
+        fila = self.ops[tipo].pop(op_id, None)
+        if not fila:
+            return
+        if tipo == "envio":
+            self._set_candidatas(op_id, 0)
+        else:
+            for e in self.envios_para(fila):
+                self._set_candidatas(e["id"], self.candidatas_por_envio.get(e["id"], 0) - 1)
+        clave = (fila["monto"], op_id)
+        for pais in fila["paises"]:
+            bucket = self.buckets[tipo].get(pais)
+            if not bucket:
+                continue
+            i = bisect.bisect_left(bucket, clave)
+            if i < len(bucket) and bucket[i] == clave:
+                del bucket[i]
+            if not bucket:
+                del self.buckets[tipo][pais]
+        claves = self.claves[tipo]
+        i = bisect.bisect_left(claves, clave)
+        if i < len(claves) and claves[i] == clave:
+            del claves[i]
+            del self.mascaras[tipo][i]
+
+    def refresh(self, conn, tipo: str, op_id: int):
+        """
+        Relee una operación desde la BD y la (re)indexa si está DISPONIBLE,
+        o la quita del índice si ya no lo está o no existe.
+        """
+        with self._lock:
+            if not self.loaded:
+                return
+            tabla, _, _ = TABLAS[tipo]
+            cur = conn.cursor()
+            cur.execute(f"SELECT * FROM {tabla} WHERE id=? AND estado='DISPONIBLE'", (op_id,))
+            fila = cur.fetchone()
+            self._remove(tipo, op_id)
+            if fila:
+                fila = dict(fila)
+                self._add(tipo, fila, _paises_de(fila))
+
+    # ——— Consultas ———
+    def get(self, tipo: str, op_id: int):
+        return self.ops[tipo].get(op_id)
+
+    def operaciones(self, tipo: str, desde_id: int = None) -> list:
+        """Operaciones DISPONIBLES del tipo dado (con id > desde_id), en orden de ID."""
+        with self._lock:
+            ids = sorted(self.ops[tipo])
+            if desde_id is not None:
+                ids = ids[bisect.bisect_right(ids, desde_id):]
+            return [self.ops[tipo][i] for i in ids]
+
+    def instantanea(self, desde_id: int = None) -> tuple:
+        """
+        (envíos con id > desde_id, recepciones) DISPONIBLES en orden de ID,
+        tomados juntos bajo el lock.
+        """
+        with self._lock:
+            return self.operaciones("envio", desde_id), self.operaciones("recepcion")
+
+    def estimar_rescan(self, muestra: int = 64) -> dict:
+        """
+        Datos para elegir núcleo del rescan completo, sin recorrerlo:
+        envíos y recepciones DISPONIBLES, palabras de 64 bits de las máscaras
+        y pares que el índice revisaría por envío (promedio sobre `muestra`
+        envíos repartidos por ID: el mínimo entre buckets y rango de montos).
+        """
+        with self._lock:
+            envios, recepciones = self.ops["envio"], self.ops["recepcion"]
+            bits = max((m.bit_length() for tipo in ("envio", "recepcion") for m in self.mascaras[tipo]), default=0)
+            ids = sorted(envios)
+            paso = max(1, len(ids) // muestra)
+            claves = self.claves["recepcion"]
+            revisados = []
+            for op_id in ids[::paso]:
+                e = envios[op_id]
+                lo, hi = rango_recepciones(e["monto"])
+                desde, hasta = (lo, float("-inf")), (hi, float("inf"))
+                rango = bisect.bisect_right(claves, hasta) - bisect.bisect_left(claves, desde)
+                total = 0
+                for pais in e["paises"]:
+                    bucket = self.buckets["recepcion"].get(pais)
+                    if bucket:
+                        total += bisect.bisect_right(bucket, hasta) - bisect.bisect_left(bucket, desde)
+                revisados.append(min(total, rango))
+            return {
+                "envios": len(envios),
+                "recepciones": len(recepciones),
+                "palabras": max(1, -(-bits // 64)),
+                "pares_por_envio": sum(revisados) / len(revisados) if revisados else 0.0,
+            }
+
+    def recorrer(self, limite: int = None, stats: dict = None, desde_id: int = None):
+        """
+        Generador de (envío, [recepciones que califican]) para cada envío
+        DISPONIBLE con al menos una candidata (y id > desde_id), en orden de ID.
+        Con `limite` se devuelven sólo las `limite` mejores (ver puntaje()).
+        """
+        for e in self.operaciones("envio", desde_id):
+            candidatas = self.recepciones_para(e, stats)
+            if candidatas:
+                yield e, candidatas if limite is None else mejores_candidatas(e, candidatas, limite)
+
+    def candidatas(self, tipo: str, paises, lo: float = float("-inf"), hi: float = float("inf"),
+                   mascara: int = None) -> list:
+        """
+        Operaciones del tipo dado que comparten al menos un país con `paises`
+        (cuya máscara es `mascara`) y cuyo monto está en [lo, hi], en orden de ID.
+        """
+        desde, hasta = (lo, float("-inf")), (hi, float("inf"))
+        with self._lock:
+            claves = self.claves[tipo]
+            i = bisect.bisect_left(claves, desde)
+            j = bisect.bisect_right(claves, hasta)
+            rangos, total = [], 0
+            for pais in paises:
+                bucket = self.buckets[tipo].get(pais)
+                if not bucket:
+                    continue
+                bi = bisect.bisect_left(bucket, desde)
+                bj = bisect.bisect_right(bucket, hasta)
+                rangos.append((bucket, bi, bj))
+                total += bj - bi
+            if total < j - i:
+                # Pocos candidatos por país: unir los buckets
+                ids = {op_id for bucket, bi, bj in rangos for _, op_id in bucket[bi:bj]}
+            else:
+                # Rango denso: un AND por operación sobre la lista única
+                if mascara is None:
+                    mascara = catalogue.mascara(paises)
+                ids = [c[1] for c, m in zip(claves[i:j], self.mascaras[tipo][i:j]) if m & mascara]
+            return [self.ops[tipo][op_id] for op_id in sorted(ids)]
+
+    def recepciones_para(self, envio: dict, stats: dict = None) -> list:
+        """
+        Recepciones que califican (país y monto) con el envío dado, en orden de ID.
+        Si se pasa `stats`, suma en stats["evaluados"] los pares comparados.
+        """
+        lo, hi = rango_recepciones(envio["monto"])
+        candidatas = self.candidatas("recepcion", envio["paises"], lo, hi, envio["mascara"])
+        if stats is not None:
+            stats["evaluados"] += len(candidatas)
+        return [r for r in candidatas if monto_compatible(envio["monto"], r["monto"])]
+
+    def envios_para(self, recepcion: dict, stats: dict = None) -> list:
+        """
+        Envíos que califican (país y monto) con la recepción dada, en orden de ID.
+        Si se pasa `stats`, suma en stats["evaluados"] los pares comparados.
+        """
+        lo, hi = rango_envios(recepcion["monto"])
+        candidatos = self.candidatas("envio", recepcion["paises"], lo, hi, recepcion["mascara"])
+        if stats is not None:
+            stats["evaluados"] += len(candidatos)
+        return [e for e in candidatos if monto_compatible(e["monto"], recepcion["monto"])]
@@ -0,0 +1,109 @@
+import logging
+
+from backend import config
+from backend.match_index import RATIO_MIN, RATIO_MAX, DIFF_MAX, mejores_candidatas
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el índice en Python puro
+    np = None
+
+# ——————————————————————————————
+# Núcleo vectorizado del matching (NumPy opcional)
+# ——————————————————————————————
+DISPONIBLE = np is not None
+
+_PALABRA = 64
+_MASCARA_PALABRA = (1 << _PALABRA) - 1
+
+
+# Costos aproximados (ns) medidos en el rescan completo: el núcleo NumPy paga
+# cada celda envío × recepción y crece con las palabras de la máscara; el
+# índice paga cada par revisado más un fijo por envío (bisect, buckets).
+_NS_CELDA = 25
+_NS_CELDA_PALABRA = 3
+_NS_PAR_INDICE = 900
+_NS_ENVIO_INDICE = 12000
+
+
+def conviene_numpy(estimacion: dict) -> bool:
+    """
+    True si, según MatchIndex.estimar_rescan(), el núcleo NumPy sale más
+    barato que el índice. Con muchos países (máscaras anchas) y pocos pares
+    por envío la matriz E×R es casi toda desperdicio y gana el índice.
+    """
+    celda = _NS_CELDA + _NS_CELDA_PALABRA * estimacion["palabras"]
+    costo_numpy = estimacion["recepciones"] * celda
+    costo_indice = estimacion["pares_por_envio"] * _NS_PAR_INDICE + _NS_ENVIO_INDICE
+    return costo_numpy < costo_indice
+
+
+def usar_numpy(kernel: str = None, completo: bool = True, estimacion: dict = None) -> bool:
+    """
+    Decide el núcleo según `kernel` o config.MATCH_KERNEL. En "auto" se usa el
+    índice salvo en el rescan completo (`completo`) cuando `estimacion`
+    (MatchIndex.estimar_rescan) indica que NumPy es más barato: las consultas
+    parciales (top-k, keyset de la cola de swipe) y las cargas dispersas, con
+    muchos países, rinden más con el índice por rango de montos.
+    """
+    kernel = (kernel or config.MATCH_KERNEL).lower()
+    if kernel == "python":
+        return False
+    if kernel == "numpy" and np is None:
+        logging.warning("MATCH_KERNEL=numpy pero NumPy no está instalado; se usa Python.")
+    if kernel == "auto" and (not completo or estimacion is None or not conviene_numpy(estimacion)):
+        return False
+    return np is not None
+
+
+def _mascaras(ops: list, palabras: int):
+    """Máscaras enteras de países como matriz uint64 (n, palabras)."""
+    return np.array(
+        [[(op["mascara"] >> (_PALABRA * w)) & _MASCARA_PALABRA for w in range(palabras)] for op in ops],
+        dtype=np.uint64,
+    ).reshape(len(ops), palabras)
+
+
+def recorrer(envios: list, recepciones: list, limite: int = None, stats: dict = None):
+    """
+    Generador de (envío, [recepciones que califican]) para cada envío con al
+    menos una candidata, en el mismo orden que el camino en Python: envíos y
+    recepciones por ID. `envios` y `recepciones` son filas del MatchIndex
+    (con 'monto' y 'mascara'), ya ordenadas por ID. Con `limite` se devuelven
+    sólo las `limite` mejores candidatas (ver match_index.puntaje).
+
+    El predicado de monto y el AND de máscaras se evalúan como broadcast sobre
+    bloques de envíos × todas las recepciones; cada bloque tiene a lo sumo
+    config.MATCH_KERNEL_CELDAS celdas. En stats["evaluados"] se suman las celdas.
+    """
+    if not envios or not recepciones:
+        return
+    bits = max(op["mascara"].bit_length() for op in envios + recepciones)
+    palabras = max(1, -(-bits // _PALABRA))
+
+    montos_e = np.array([e["monto"] for e in envios], dtype=np.float64)
+    montos_r = np.array([r["monto"] for r in recepciones], dtype=np.float64)[None, :]
+    mascaras_e = _mascaras(envios, palabras)
+    mascaras_r = _mascaras(recepciones, palabras)[None, :, :]
+
+    bloque = max(1, config.MATCH_KERNEL_CELDAS // (len(recepciones) * palabras))
+    for a in range(0, len(envios), bloque):
+        me = montos_e[a:a + bloque, None]
+        # Misma regla que monto_compatible: ratio 0 si el envío es 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(me != 0, montos_r / me, 0.0)
+        ok = ((ratio >= RATIO_MIN) & (ratio <= RATIO_MAX)) | (np.abs(me - montos_r) <= DIFF_MAX)
+        ok &= ((mascaras_e[a:a + bloque, None, :] & mascaras_r) != 0).any(axis=2)
+        if stats is not None:
+            stats["evaluados"] += ok.size
+
+        filas, columnas = np.nonzero(ok)
+        if not len(filas):
+            continue
+        # np.nonzero recorre por filas: cada envío ocupa un tramo contiguo
+        inicios = np.flatnonzero(np.r_[True, filas[1:] != filas[:-1]])
+        fines = np.r_[inicios[1:], len(filas)]
+        for i, j in zip(inicios.tolist(), fines.tolist()):
+            e = envios[a + int(filas[i])]
+            candidatas = [recepciones[c] for c in columnas[i:j].tolist()]
+            yield e, candidatas if limite is None else mejores_candidatas(e, candidatas, limite)
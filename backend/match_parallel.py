@@ -0,0 +1,66 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from backend import config, match_kernel
+from backend.match_index import MatchIndex
+
+# ——————————————————————————————
+# Rescan completo repartido en procesos
+# ——————————————————————————————
+# Cada worker recibe una única vez la instantánea de recepciones y después
+# procesa tramos contiguos de envíos (shards). Sólo devuelve IDs: la escritura
+# la hace el proceso principal con su única conexión de escritura.
+_recepciones = None
+_indice = None
+_kernel = None
+
+
+def _liviana(op: dict) -> dict:
+    # Sólo lo que el matching necesita viaja a los workers
+    return {"id": op["id"], "monto": op["monto"], "paises": op["paises"], "mascara": op["mascara"]}
+
+
+def _iniciar_worker(recepciones: list, kernel: str):
+    global _recepciones, _indice, _kernel
+    _recepciones, _kernel = recepciones, kernel
+    if not match_kernel.usar_numpy(kernel):
+        _indice = MatchIndex()
+        _indice.cargar_filas("recepcion", recepciones)
+
+
+def _procesar_shard(envios: list) -> tuple:
+    """Devuelve ([(envio_id, [recepcion_id, ...]), ...], pares evaluados) del shard."""
+    stats = {"evaluados": 0}
+    if _indice is None:
+        pares = match_kernel.recorrer(envios, _recepciones, stats=stats)
+    else:
+        pares = ((e, _indice.recepciones_para(e, stats)) for e in envios)
+    return [(e["id"], [r["id"] for r in rs]) for e, rs in pares if rs], stats["evaluados"]
+
+
+def recorrer(envios: list, recepciones: list, workers: int, stats: dict = None, kernel: str = None):
+    """
+    Igual que MatchIndex.recorrer / match_kernel.recorrer, pero repartiendo
+    los envíos (ordenados por ID) en shards contiguos entre `workers` procesos.
+    Los resultados se consumen en el orden de los shards, así que la salida
+    es idéntica y determinista respecto del recorrido secuencial.
+    """
+    if not envios or not recepciones:
+        return
+    por_id = {r["id"]: r for r in recepciones}
+    por_envio = {e["id"]: e for e in envios}
+    # Varios shards por worker para repartir mejor la carga
+    tamaño = max(1, -(-len(envios) // (workers * 4)))
+    shards = [[_liviana(e) for e in envios[i:i + tamaño]] for i in range(0, len(envios), tamaño)]
+    logging.debug(f"Rescan paralelo: {len(envios)} envíos en {len(shards)} shards, {workers} workers.")
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_iniciar_worker,
+        initargs=([_liviana(r) for r in recepciones], kernel or config.MATCH_KERNEL),
+    ) as executor:
+        for pares, evaluados in executor.map(_procesar_shard, shards):
+            if stats is not None:
+                stats["evaluados"] += evaluados
+            for envio_id, recepcion_ids in pares:
+                yield por_envio[envio_id], [por_id[i] for i in recepcion_ids]
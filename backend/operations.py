@@ -1,13 +1,24 @@
 import logging
+import heapq
 import itertools
+import threading
 from datetime import datetime
-from backend.db_manager import DatabaseManager
+from backend import config
+from backend.db_manager import get_database
+from backend.countries import catalogue, normalize_country, firma_paises
+from backend import match_kernel, match_parallel
+from backend.match_index import (
+    MatchIndex, puntaje, mejores_candidatas, RATIO_MIN, RATIO_MAX, DIFF_MAX
+)
 
 # Configurar logging
 logging.basicConfig(level=logging.DEBUG)
 
-# Instancia global de la base de datos
-db = DatabaseManager()
+# Conexiones compartidas por todo el proceso (escritor único + pool de lectores)
+db = get_database()
+
+# Índice en memoria de operaciones DISPONIBLES (se carga al primer uso)
+match_index = MatchIndex()
 
 # ——————————————————————————————
 # Helpers y Validaciones
@@ -16,35 +27,26 @@ def current_datetime() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 def split_countries_list(countries_str: str) -> list:
-    return [p.strip().upper() for p in countries_str.split(',') if p.strip()]
+    return [normalize_country(p) for p in countries_str.split(',') if p.strip()]
 
 def check_duplicate_operation(monto: float, paises_str: str, tipo: str) -> bool:
     """
     Comprueba si ya existe una operación (envío o recepción) con mismo monto
     y mismo conjunto de países. Devuelve True si ya existe (duplicado).
+    Es una única búsqueda en el índice (monto, paises_firma).
     """
-    paises_in = set(split_countries_list(paises_str))
-    cur = db.conn.cursor()
-
-    if tipo.lower() == "envio":
-        cur.execute("SELECT id FROM envios WHERE monto = ?", (monto,))
-        candidatos = [r["id"] for r in cur.fetchall()]
-        for eid in candidatos:
-            cur.execute("SELECT pais FROM envio_paises WHERE envio_id = ?", (eid,))
-            existentes = {r["pais"] for r in cur.fetchall()}
-            if existentes == paises_in:
-                return True
-
-    elif tipo.lower() == "recepcion":
-        cur.execute("SELECT id FROM recepciones WHERE monto = ?", (monto,))
-        candidatos = [r["id"] for r in cur.fetchall()]
-        for rid in candidatos:
-            cur.execute("SELECT pais FROM recepcion_paises WHERE recepcion_id = ?", (rid,))
-            existentes = {r["pais"] for r in cur.fetchall()}
-            if existentes == paises_in:
-                return True
-
-    return False
+    tablas = {"envio": "envios", "recepcion": "recepciones"}
+    tabla = tablas.get(tipo.lower())
+    if not tabla:
+        return False
+    firma = firma_paises(split_countries_list(paises_str))
+    with db.reader() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT 1 FROM {tabla} WHERE monto = ? AND paises_firma = ? LIMIT 1",
+            (monto, firma)
+        )
+        return cur.fetchone() is not None
 
 
 
@@ -53,13 +55,9 @@ def check_duplicate_operation(monto: float, paises_str: str, tipo: str) -> bool:
 # ——————————————————————————————
 def add_new_country(country: str):
     try:
-        cur = db.conn.cursor()
-        cur.execute(
-            "INSERT OR IGNORE INTO paises (nombre) VALUES (?)",
-            (country.upper().strip(),)
-        )
-        db.conn.commit()
-        logging.info(f"Nuevo país agregado: {country}")
+        # Write-through: BD + catálogo en memoria
+        if catalogue.add(country):
+            logging.info(f"Nuevo país agregado: {country}")
     except Exception:
         logging.exception("Error en add_new_country")
 
@@ -67,81 +65,327 @@ def add_new_country(country: str):
 # Obtener Operaciones Disponibles
 # ——————————————————————————————
 def fetch_envios_disponibles() -> list:
-    cur = db.conn.cursor()
-    cur.execute("SELECT * FROM envios WHERE estado='DISPONIBLE'")
-    return [dict(r) for r in cur.fetchall()]
+    with db.reader() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM envios WHERE estado='DISPONIBLE'")
+        return [dict(r) for r in cur.fetchall()]
 
 def fetch_recepciones_disponibles() -> list:
-    cur = db.conn.cursor()
-    cur.execute("SELECT * FROM recepciones WHERE estado='DISPONIBLE'")
-    return [dict(r) for r in cur.fetchall()]
+    with db.reader() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM recepciones WHERE estado='DISPONIBLE'")
+        return [dict(r) for r in cur.fetchall()]
 
 # ——————————————————————————————
 # Obtener Países de Cada Operación
 # ——————————————————————————————
 def fetch_paises_envio(envio_id: int) -> set:
-    cur = db.conn.cursor()
-    cur.execute("SELECT pais FROM envio_paises WHERE envio_id=?", (envio_id,))
-    return {r['pais'] for r in cur.fetchall()}
+    with db.reader() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pais FROM envio_paises WHERE envio_id=?", (envio_id,))
+        return {r['pais'] for r in cur.fetchall()}
 
 def fetch_paises_recepcion(recepcion_id: int) -> set:
-    cur = db.conn.cursor()
-    cur.execute("SELECT pais FROM recepcion_paises WHERE recepcion_id=?", (recepcion_id,))
-    return {r['pais'] for r in cur.fetchall()}
+    with db.reader() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pais FROM recepcion_paises WHERE recepcion_id=?", (recepcion_id,))
+        return {r['pais'] for r in cur.fetchall()}
+
+def sincronizar_cambios_externos():
+    """
+    Si otro proceso escribió en la BD (importación por CLI con la app abierta),
+    recarga el catálogo de países y el índice de matching con sus contadores;
+    si no, no hace nada. Es una sola consulta de PRAGMA.
+    """
+    if not db.cambio_externo():
+        return
+    logging.info("La BD cambió desde otro proceso: se recargan países e índice de matching.")
+    catalogue.invalidate()
+    with db.writer() as conn:
+        if match_index.loaded:
+            match_index.load(conn)
+
+def get_match_index() -> MatchIndex:
+    sincronizar_cambios_externos()
+    if not match_index.loaded:
+        # Con el lock de escritura: ninguna escritura puede quedar fuera del índice
+        with db.writer() as conn:
+            if not match_index.loaded:
+                match_index.load(conn)
+    return match_index
+
+def recorrer_matches(limite: int = None, stats: dict = None, kernel: str = None, workers: int = 1,
+                     desde_id: int = None):
+    """
+    Generador de (envío, [recepciones que califican]) sobre las operaciones
+    DISPONIBLES, en orden de ID (sólo envíos con id > desde_id si se indica).
+    Es perezoso: quien lo consume puede cortar en cualquier momento.
+    Usa el núcleo NumPy o el índice en Python según `kernel` /
+    config.MATCH_KERNEL (en "auto", NumPy sólo para la pasada completa sin
+    `limite` ni `desde_id` y cuando idx.estimar_rescan() lo da por más
+    barato); ambos dan el mismo resultado.
+    Con `workers` > 1 y al menos config.MATCH_PARALLEL_MIN envíos, reparte
+    los envíos entre procesos (mismo resultado y mismo orden).
+    """
+    idx = get_match_index()
+    completo = limite is None and desde_id is None
+    estimacion = idx.estimar_rescan() if completo and (kernel or config.MATCH_KERNEL) == "auto" else None
+    numpy = match_kernel.usar_numpy(kernel, completo, estimacion)
+    if workers > 1:
+        envios, recepciones = idx.instantanea(desde_id)
+        if len(envios) >= config.MATCH_PARALLEL_MIN:
+            # Los workers reciben el núcleo ya decidido, no "auto"
+            return match_parallel.recorrer(envios, recepciones, workers, stats, "numpy" if numpy else "python")
+    if numpy:
+        envios, recepciones = idx.instantanea(desde_id)
+        return match_kernel.recorrer(envios, recepciones, limite, stats)
+    return idx.recorrer(limite, stats, desde_id)
+
+def refrescar_indice(envio_id: int = None, recepcion_id: int = None):
+    """
+    Sincroniza el índice en memoria tras un cambio de monto, países o estado.
+    """
+    with db.writer() as conn:
+        if envio_id is not None:
+            match_index.refresh(conn, "envio", envio_id)
+        if recepcion_id is not None:
+            match_index.refresh(conn, "recepcion", recepcion_id)
 
 # ——————————————————————————————
 # Matching Automático (60–140% o ±10000)
 # ——————————————————————————————
-def auto_match_pairings():
+_INSERT_UTILIZABLE = '''
+    INSERT OR IGNORE INTO utilizables
+    (envio_id, recepcion_id, monto_envio, monto_recepcion, diferencia, estado, fecha_hora)
+    VALUES (?, ?, ?, ?, ?, 'DISPONIBLE', ?)
+'''
+
+# Si el par ya existe se refrescan los montos (la operación pudo cambiar de monto)
+_UPSERT_UTILIZABLE = '''
+    INSERT INTO utilizables
+    (envio_id, recepcion_id, monto_envio, monto_recepcion, diferencia, estado, fecha_hora)
+    VALUES (?, ?, ?, ?, ?, 'DISPONIBLE', ?)
+    ON CONFLICT(envio_id, recepcion_id) DO UPDATE SET
+        monto_envio     = excluded.monto_envio,
+        monto_recepcion = excluded.monto_recepcion,
+        diferencia      = excluded.diferencia
+'''
+
+def _nuevas_stats() -> dict:
+    return {"evaluados": 0, "insertados": 0, "omitidos": 0, "eliminados": 0}
+
+def _fila_utilizable(e: dict, r: dict, fecha: str) -> tuple:
+    return (e['id'], r['id'], e['monto'], r['monto'], abs(e['monto'] - r['monto']), fecha)
+
+def _sincronizar_pares(cur, columna: str, op_id: int, filas: list, stats: dict):
+    """
+    Deja en utilizables exactamente los pares `filas` para la operación op_id
+    (columna 'envio_id' o 'recepcion_id'): upsert de los válidos y borrado del resto.
+    """
+    otra = "recepcion_id" if columna == "envio_id" else "envio_id"
+    cur.execute(f"SELECT {otra} FROM utilizables WHERE {columna}=?", (op_id,))
+    existentes = {row[otra] for row in cur.fetchall()}
+    validos = {f[1] if columna == "envio_id" else f[0] for f in filas}
+
+    cur.executemany(_UPSERT_UTILIZABLE, filas)
+    obsoletos = [(op_id, otro) for otro in existentes - validos]
+    cur.executemany(f"DELETE FROM utilizables WHERE {columna}=? AND {otra}=?", obsoletos)
+
+    stats["insertados"] += len(validos - existentes)
+    stats["omitidos"] += len(validos & existentes)
+    stats["eliminados"] += len(obsoletos)
+
+def invalidar_utilizables(cur, envio_ids=(), recepcion_ids=()) -> int:
+    """
+    Borra de utilizables todas las filas que referencian alguno de los
+    envíos o recepciones indicados. Devuelve la cantidad de filas borradas.
+    """
+    borradas = 0
+    for columna, ids in (("envio_id", envio_ids), ("recepcion_id", recepcion_ids)):
+        ids = [i for i in ids if i is not None]
+        if ids:
+            marcas = ",".join("?" * len(ids))
+            cur.execute(f"DELETE FROM utilizables WHERE {columna} IN ({marcas})", ids)
+            borradas += cur.rowcount
+    return borradas
+
+def compactar_utilizables(vacuum: bool = False) -> int:
+    """
+    Poda utilizables: elimina las filas cuyo envío o recepción ya no existe
+    o no está DISPONIBLE. Con `vacuum` además recupera el espacio del archivo.
+    Devuelve la cantidad de filas borradas, o None si hubo error.
+    """
+    try:
+        with db.writer() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                DELETE FROM utilizables
+                WHERE envio_id NOT IN (SELECT id FROM envios WHERE estado='DISPONIBLE')
+                   OR recepcion_id NOT IN (SELECT id FROM recepciones WHERE estado='DISPONIBLE')
+                """
+            )
+            borradas = cur.rowcount
+            conn.commit()
+            if vacuum:
+                conn.execute("VACUUM")
+        logging.info(f"compactar_utilizables: {borradas} filas eliminadas.")
+        return borradas
+    except Exception:
+        logging.exception("Error en compactar_utilizables")
+        return None
+
+def _match_envio(cur, envio_id: int, fecha: str, stats: dict):
+    """
+    Compara un único envío contra las recepciones DISPONIBLES:
+    inserta los pares nuevos y elimina los que dejaron de calificar.
+    """
+    idx = get_match_index()
+    e = idx.get("envio", envio_id)
+    if not e:
+        # Ya no está DISPONIBLE: ninguno de sus pares sigue siendo utilizable
+        stats["eliminados"] += invalidar_utilizables(cur, envio_ids=[envio_id])
+        return
+    filas = [_fila_utilizable(e, r, fecha) for r in idx.recepciones_para(e, stats)]
+    _sincronizar_pares(cur, "envio_id", envio_id, filas, stats)
+
+def _match_recepcion(cur, recepcion_id: int, fecha: str, stats: dict):
+    """
+    Compara una única recepción contra los envíos DISPONIBLES:
+    inserta los pares nuevos y elimina los que dejaron de calificar.
+    """
+    idx = get_match_index()
+    r = idx.get("recepcion", recepcion_id)
+    if not r:
+        # Ya no está DISPONIBLE: ninguno de sus pares sigue siendo utilizable
+        stats["eliminados"] += invalidar_utilizables(cur, recepcion_ids=[recepcion_id])
+        return
+    filas = [_fila_utilizable(e, r, fecha) for e in idx.envios_para(r, stats)]
+    _sincronizar_pares(cur, "recepcion_id", recepcion_id, filas, stats)
+
+def _auto_match_sql(cur, fecha: str, stats: dict):
+    """
+    Rescan completo resuelto en SQLite: une envíos y recepciones DISPONIBLES
+    por país y aplica la regla de monto en la misma consulta.
+    Sólo se conoce la cantidad insertada; evaluados/omitidos quedan en None.
+    """
+    cur.execute(
+        '''
+        INSERT OR IGNORE INTO utilizables
+        (envio_id, recepcion_id, monto_envio, monto_recepcion, diferencia, estado, fecha_hora)
+        SELECT DISTINCT e.id, r.id, e.monto, r.monto, ABS(e.monto - r.monto), 'DISPONIBLE', ?
+        FROM envios e
+        JOIN envio_paises     ep ON ep.envio_id = e.id
+        JOIN recepcion_paises rp ON rp.pais     = ep.pais
+        JOIN recepciones      r  ON r.id        = rp.recepcion_id
+        WHERE e.estado = 'DISPONIBLE'
+          AND r.estado = 'DISPONIBLE'
+          AND (
+                (CASE WHEN e.monto <> 0 THEN r.monto / e.monto ELSE 0 END) BETWEEN ? AND ?
+                OR ABS(e.monto - r.monto) <= ?
+              )
+        ORDER BY e.id, r.id
+        ''',
+        (fecha, RATIO_MIN, RATIO_MAX, DIFF_MAX)
+    )
+    stats["insertados"] = cur.rowcount
+    stats["evaluados"] = stats["omitidos"] = None
+
+def _auto_match_python(cur, fecha: str, stats: dict, pares):
+    """
+    Escribe el rescan completo en memoria (`pares` de recorrer_matches).
+    Los pares que califican se acumulan y se escriben por lotes con executemany.
+    """
+    lote = []
+    calificados = 0
+    for e, recepciones in pares:
+        # Recepciones con país en común y monto en rango (60–140% o ±10000)
+        for r in recepciones:
+            lote.append(_fila_utilizable(e, r, fecha))
+        if len(lote) >= config.MATCH_BATCH_SIZE:
+            cur.executemany(_INSERT_UTILIZABLE, lote)
+            stats["insertados"] += cur.rowcount
+            calificados += len(lote)
+            lote = []
+    if lote:
+        cur.executemany(_INSERT_UTILIZABLE, lote)
+        stats["insertados"] += cur.rowcount
+        calificados += len(lote)
+    # Pares que calificaron pero ya estaban en utilizables
+    stats["omitidos"] = calificados - stats["insertados"]
+
+def auto_match_pairings(envio_id: int = None, recepcion_id: int = None, engine: str = None,
+                        workers: int = None) -> dict:
+    """
+    Genera los matches utilizables.
+    Sin argumentos hace el rescan completo envíos × recepciones.
+    Con envio_id o recepcion_id sólo compara esa operación contra el lado
+    opuesto (modo incremental); el resultado coincide con el rescan completo.
+    `engine` ("python" o "sql") elige el motor del rescan completo;
+    por defecto se usa config.MATCH_ENGINE. `workers` (por defecto
+    config.MATCH_WORKERS) reparte el rescan completo en Python entre procesos.
+
+    Toda la pasada corre en una única transacción con una sola marca de tiempo.
+    Devuelve {"evaluados", "insertados", "omitidos", "eliminados"}: pares
+    comparados, pares nuevos, pares que ya existían y pares borrados por
+    dejar de calificar (sólo en modo incremental). None si hubo error.
+    """
+    stats = _nuevas_stats()
+    fecha = current_datetime()
     try:
-        cur = db.conn.cursor()
-        envios = fetch_envios_disponibles()
-        recepciones = fetch_recepciones_disponibles()
-        for e in envios:
-            paises_e = fetch_paises_envio(e['id'])
-            for r in recepciones:
-                paises_r = fetch_paises_recepcion(r['id'])
-                # Filtro de país en común
-                if not (paises_e & paises_r):
-                    continue
-                monto_e, monto_r = e['monto'], r['monto']
-                ratio = monto_r / monto_e if monto_e else 0
-                diff = abs(monto_e - monto_r)
-                # Filtro de monto: ratio 0.6–1.4 OR diff <=10000
-                if (0.6 <= ratio <= 1.4) or (diff <= 10000):
-                    fecha = current_datetime()
-                    cur.execute(
-                        '''
-                        INSERT OR IGNORE INTO utilizables
-                        (envio_id, recepcion_id, monto_envio, monto_recepcion, diferencia, estado, fecha_hora)
-                        VALUES (?, ?, ?, ?, ?, 'DISPONIBLE', ?)
-                        ''',
-                        (e['id'], r['id'], monto_e, monto_r, diff, fecha)
-                    )
-        db.conn.commit()
+        with db.writer() as conn:
+            cur = conn.cursor()
+            completo_python = (envio_id is None and recepcion_id is None
+                               and (engine or config.MATCH_ENGINE) != "sql")
+            if completo_python:
+                workers = workers or config.MATCH_WORKERS
+                pares = recorrer_matches(stats=stats, workers=workers)
+                if workers > 1:
+                    # Los workers terminan antes de abrir la transacción de escritura;
+                    # el lock de escritura ya impide que algo cambie entretanto
+                    pares = list(pares)
+            if not conn.in_transaction:
+                cur.execute("BEGIN")
+            if envio_id is not None or recepcion_id is not None:
+                if envio_id is not None:
+                    _match_envio(cur, envio_id, fecha, stats)
+                if recepcion_id is not None:
+                    _match_recepcion(cur, recepcion_id, fecha, stats)
+            elif (engine or config.MATCH_ENGINE) == "sql":
+                _auto_match_sql(cur, fecha, stats)
+            else:
+                _auto_match_python(cur, fecha, stats, pares)
+            conn.commit()
+        logging.debug(f"auto_match_pairings: {stats}")
+        return stats
     except Exception:
         logging.exception("Error en auto_match_pairings")
+        return None
 
 # ——————————————————————————————
 # CRUD de Envios/Recepciones
 # ——————————————————————————————
 def add_envio(monto: float, paises_str: str) -> int:
     try:
-        cur = db.conn.cursor()
-        fecha = current_datetime()
-        cur.execute(
-            "INSERT INTO envios (monto, estado, fecha_hora) VALUES (?, 'DISPONIBLE', ?)",
-            (monto, fecha)
-        )
-        envio_id = cur.lastrowid
-        for pais in split_countries_list(paises_str):
+        with db.writer() as conn:
+            cur = conn.cursor()
+            fecha = current_datetime()
+            paises = split_countries_list(paises_str)
             cur.execute(
-                "INSERT INTO envio_paises (envio_id, pais) VALUES (?, ?)",
-                (envio_id, pais)
+                "INSERT INTO envios (monto, estado, fecha_hora) VALUES (?, 'DISPONIBLE', ?)",
+                (monto, fecha)
             )
-        db.conn.commit()
-        auto_match_pairings()
-        return envio_id
+            envio_id = cur.lastrowid
+            # Los triggers de envio_paises completan las columnas paises y paises_firma
+            for pais in paises:
+                cur.execute(
+                    "INSERT INTO envio_paises (envio_id, pais) VALUES (?, ?)",
+                    (envio_id, pais)
+                )
+            conn.commit()
+            refrescar_indice(envio_id=envio_id)
+            auto_match_pairings(envio_id=envio_id)
+            return envio_id
     except Exception:
         logging.exception("Error en add_envio")
         return None
@@ -149,21 +393,25 @@ def add_envio(monto: float, paises_str: str) -> int:
 
 def add_recepcion(monto: float, paises_str: str) -> int:
     try:
-        cur = db.conn.cursor()
-        fecha = current_datetime()
-        cur.execute(
-            "INSERT INTO recepciones (monto, estado, fecha_hora) VALUES (?, 'DISPONIBLE', ?)",
-            (monto, fecha)
-        )
-        recepcion_id = cur.lastrowid
-        for pais in split_countries_list(paises_str):
+        with db.writer() as conn:
+            cur = conn.cursor()
+            fecha = current_datetime()
+            paises = split_countries_list(paises_str)
             cur.execute(
-                "INSERT INTO recepcion_paises (recepcion_id, pais) VALUES (?, ?)",
-                (recepcion_id, pais)
+                "INSERT INTO recepciones (monto, estado, fecha_hora) VALUES (?, 'DISPONIBLE', ?)",
+                (monto, fecha)
             )
-        db.conn.commit()
-        auto_match_pairings()
-        return recepcion_id
+            recepcion_id = cur.lastrowid
+            # Los triggers de recepcion_paises completan las columnas paises y paises_firma
+            for pais in paises:
+                cur.execute(
+                    "INSERT INTO recepcion_paises (recepcion_id, pais) VALUES (?, ?)",
+                    (recepcion_id, pais)
+                )
+            conn.commit()
+            refrescar_indice(recepcion_id=recepcion_id)
+            auto_match_pairings(recepcion_id=recepcion_id)
+            return recepcion_id
     except Exception:
         logging.exception("Error en add_recepcion")
         return None
@@ -195,163 +443,217 @@ def add_recepcion_ui(monto: float, paises: str) -> str:
 # ——————————————————————————————
 # Gestión de Matches
 # ——————————————————————————————
-def get_utilizables() -> list:
+def get_utilizables(limit: int = None, after_id: int = 0) -> list:
     """
-    Devuelve todos los matches utilizables, incluyendo su estado.
+    Devuelve los matches utilizables, incluyendo su estado, en orden de ID.
+    Paginación por keyset: `limit` filas con id > `after_id`; para la página
+    siguiente se pasa el id de la última fila recibida. Sin `limit`, todas.
+
+    Los países de cada lado salen de la columna `paises` de la operación,
+    sin join con las tablas de países, así cada país aparece una sola vez.
     """
     try:
-        cur = db.conn.cursor()
-        cur.execute(
-            """
-            SELECT
-                u.id,
-                u.envio_id,
-                u.recepcion_id,
-                u.monto_envio,
-                u.monto_recepcion,
-                u.diferencia,
-                u.estado,
-                group_concat(ep.pais)   AS paises_envio,
-                group_concat(rp.pais)   AS paises_recepcion,
-                u.fecha_hora
-            FROM utilizables u
-            JOIN envio_paises    ep ON ep.envio_id    = u.envio_id
-            JOIN recepcion_paises rp ON rp.recepcion_id = u.recepcion_id
-            GROUP BY u.id
-            """
-        )
-        return [dict(r) for r in cur.fetchall()]
+        with db.reader() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT
+                    u.id,
+                    u.envio_id,
+                    u.recepcion_id,
+                    u.monto_envio,
+                    u.monto_recepcion,
+                    u.diferencia,
+                    u.estado,
+                    e.paises    AS paises_envio,
+                    r.paises    AS paises_recepcion,
+                    u.fecha_hora
+                FROM utilizables u
+                LEFT JOIN envios      e ON e.id = u.envio_id
+                LEFT JOIN recepciones r ON r.id = u.recepcion_id
+                WHERE u.id > ?
+                ORDER BY u.id
+                LIMIT ?
+                """,
+                (after_id or 0, -1 if limit is None else limit)
+            )
+            return [dict(r) for r in cur.fetchall()]
     except Exception:
         logging.exception("Error en get_utilizables")
         return []
 
 
 
-def get_available_matches() -> list:
+def iter_available_matches(limite: int = None, desde_id: int = None):
     """
-    Para cada envío DISPONIBLE, devuelve hasta 2 recepciones DISPONIBLES
-    que cumplan país en común y filtro de monto.
+    Generador de bloques {envio, candidatas}: para cada envío DISPONIBLE
+    (con id > desde_id), las 2 mejores recepciones DISPONIBLES (ver
+    match_index.puntaje) que cumplan país en común y filtro de monto. Se detiene tras `limite` bloques; los siguientes
+    no se calculan. Para continuar se pasa como desde_id el último envío recibido.
     """
-    resultado = []
-    envios = fetch_envios_disponibles()
-    recepciones = fetch_recepciones_disponibles()
+    # País en común + filtro de monto (índice en memoria o núcleo NumPy)
+    pares = recorrer_matches(limite=2, desde_id=desde_id)
+    for e, candidatas in itertools.islice(pares, limite):
+        yield {
+            "envio":      dict(e),
+            "candidatas": [dict(r) for r in candidatas]
+        }
+
+def get_available_matches(limite: int = None, desde_id: int = None) -> list:
+    """
+    Lista de bloques {envio, candidatas} (ver iter_available_matches).
+    Sin `limite` devuelve todos.
+    """
+    return list(iter_available_matches(limite, desde_id))
 
-    for e in envios:
-        paises_e = fetch_paises_envio(e['id'])
-        candidatas = []
-        for r in recepciones:
-            # 1) País en común?
-            if not (paises_e & fetch_paises_recepcion(r['id'])):
-                continue
-            # 2) Filtro de monto
-            me, mr = e['monto'], r['monto']
-            ratio = mr / me if me else 0
-            diff  = abs(me - mr)
-            if (0.6 <= ratio <= 1.4) or (diff <= 10000):
-                candidatas.append(r)
-            if len(candidatas) >= 2:
-                break
 
-        if candidatas:
-            resultado.append({
-                "envio":      e,
-                "candidatas": candidatas
-            })
 
-    return resultado
+def preparar_bloques_swipe(limite: int = None, desde_id: int = None, envio_ids: list = None) -> list:
+    """
+    Bloques {envio, candidatas} listos para las tarjetas de swipe: el envío
+    trae 'paises_texto' y cada candidata 'paises_comunes', ya resueltos.
+    Con `envio_ids` recalcula sólo esos envíos (actualización delta de la
+    cola de la UI); los que ya no tienen candidatas no se devuelven.
+    """
+    try:
+        if envio_ids is not None:
+            idx = get_match_index()
+            bloques = []
+            for envio_id in sorted(envio_ids):
+                e = idx.get("envio", envio_id)
+                candidatas = mejores_candidatas(e, idx.recepciones_para(e), 2) if e else []
+                if candidatas:
+                    bloques.append({"envio": dict(e), "candidatas": [dict(r) for r in candidatas]})
+        else:
+            bloques = get_available_matches(limite, desde_id)
+        for bloque in bloques:
+            paises_e = bloque["envio"]["paises"]
+            bloque["envio"]["paises_texto"] = ", ".join(sorted(paises_e))
+            for r in bloque["candidatas"]:
+                r["paises_comunes"] = ", ".join(sorted(paises_e & r["paises"])) or "N/A"
+        return bloques
+    except Exception:
+        logging.exception("Error en preparar_bloques_swipe")
+        return []
+
+def count_available_matches() -> int:
+    """
+    Cantidad de envíos DISPONIBLES con al menos una recepción candidata
+    (lo mismo que len(get_available_matches())), leída del contador que el
+    índice mantiene en cada alta, modificación o cambio de estado.
+    """
+    return get_match_index().envios_con_candidatas
 
 
 
 def reject_match_ui(match_id: int) -> str:
     try:
-        cur = db.conn.cursor()
-        cur.execute("DELETE FROM utilizables WHERE id = ?", (match_id,))
-        db.conn.commit()
-        return f"Match {match_id} rechazado exitosamente."
+        with db.writer() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM utilizables WHERE id = ?", (match_id,))
+            conn.commit()
+            return f"Match {match_id} rechazado exitosamente."
     except Exception:
         logging.exception("Error en reject_match_ui")
         return f"Error al rechazar match {match_id}."
 
 
-def marcar_pendiente(envio_id: int, recepcion_id: int):
+def marcar_pendiente(envio_id: int, recepcion_id: int) -> bool:
     """
     Inserta el pairing en 'pendientes', marca ambas operaciones
-    como NO DISPONIBLE y borra el registro de 'utilizables'.
+    como NO DISPONIBLE y borra de 'utilizables' todos los pares que
+    involucran a cualquiera de las dos.
+    Si alguna de las dos ya no estaba DISPONIBLE (carta vieja, doble
+    confirmación) no cambia nada y devuelve False.
     """
     try:
-        cur = db.conn.cursor()
-        fecha = current_datetime()
-
-        # 1) Insertar en pendientes
-        cur.execute(
-            "INSERT OR IGNORE INTO pendientes (envio_id, recepcion_id, fecha_hora) VALUES (?, ?, ?)",
-            (envio_id, recepcion_id, fecha)
-        )
-        # 2) Actualizar estados de envío y recepción
-        cur.execute("UPDATE envios      SET estado='NO DISPONIBLE' WHERE id=?", (envio_id,))
-        cur.execute("UPDATE recepciones SET estado='NO DISPONIBLE' WHERE id=?", (recepcion_id,))
-        # 3) Eliminar de utilizables
-        cur.execute(
-            "DELETE FROM utilizables WHERE envio_id=? AND recepcion_id=?",
-            (envio_id, recepcion_id)
-        )
+        with db.writer() as conn:
+            cur = conn.cursor()
+            fecha = current_datetime()
+
+            # 1) Actualizar estados de envío y recepción (sólo si siguen DISPONIBLES)
+            cur.execute("UPDATE envios      SET estado='NO DISPONIBLE' WHERE id=? AND estado='DISPONIBLE'", (envio_id,))
+            envio_ok = cur.rowcount == 1
+            cur.execute("UPDATE recepciones SET estado='NO DISPONIBLE' WHERE id=? AND estado='DISPONIBLE'", (recepcion_id,))
+            if not (envio_ok and cur.rowcount == 1):
+                conn.rollback()
+                logging.warning(f"marcar_pendiente: envío {envio_id} o recepción {recepcion_id} ya no está DISPONIBLE.")
+                return False
+            # 2) Insertar en pendientes
+            cur.execute(
+                "INSERT OR IGNORE INTO pendientes (envio_id, recepcion_id, fecha_hora) VALUES (?, ?, ?)",
+                (envio_id, recepcion_id, fecha)
+            )
+            # 3) Eliminar de utilizables los pares que ya no pueden usarse
+            invalidar_utilizables(cur, envio_ids=[envio_id], recepcion_ids=[recepcion_id])
 
-        db.conn.commit()
+            conn.commit()
+            refrescar_indice(envio_id, recepcion_id)
+            return True
     except Exception:
         logging.exception("Error en marcar_pendiente")
+        return False
 
 
 
 def confirm_match_ui(match_id: int) -> str:
     try:
-        cur = db.conn.cursor()
-        cur.execute("SELECT envio_id, recepcion_id FROM utilizables WHERE id = ?", (match_id,))
-        row = cur.fetchone()
-        if not row:
-            return f"Match {match_id} no encontrado."
-        enviar, recep = row['envio_id'], row['recepcion_id']
-        marcar_pendiente(enviar, recep)
-        return f"Match {match_id} marcado como pendiente."  
+        with db.writer() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT envio_id, recepcion_id FROM utilizables WHERE id = ?", (match_id,))
+            row = cur.fetchone()
+            if not row:
+                return f"Match {match_id} no encontrado."
+            enviar, recep = row['envio_id'], row['recepcion_id']
+            if not marcar_pendiente(enviar, recep):
+                return f"Match {match_id} ya no está disponible."
+            return f"Match {match_id} marcado como pendiente."
     except Exception:
         logging.exception("Error en confirm_match_ui")
         return f"Error al confirmar match {match_id}."
 
 
-def get_prioritized_matches() -> list:
-    matches = get_available_matches()
-    for m in matches:
-        m['Prioridad'] = 1
-    matches.sort(key=lambda x: (-x['Prioridad'], x['id']))
-    return matches[:5]
+def get_prioritized_matches(k: int = 5) -> list:
+    """
+    Los `k` mejores bloques {envio, candidatas}, ordenados por el puntaje de
+    su mejor candidata (desempate: envío más antiguo, luego ID). Se eligen
+    con un heap acotado; 'Prioridad' es la posición (1 = mejor).
+    """
+    def clave(bloque):
+        e = bloque["envio"]
+        return puntaje(e, bloque["candidatas"][0]), e.get("fecha_hora") or "", e["id"]
+
+    matches = heapq.nsmallest(k, iter_available_matches(), key=clave)
+    for posicion, m in enumerate(matches, 1):
+        m['Prioridad'] = posicion
+    return matches
 
 
 def get_pending_matches() -> list:
     """
-    Devuelve matches pendientes con IDs, montos y países de envío y recepción.
-    Evita duplicados de país usando DISTINCT.
+    Devuelve matches pendientes con IDs, montos y países de envío y recepción
+    (columna `paises`, ya sin duplicados).
     """
     try:
-        cur = db.conn.cursor()
-        cur.execute(
-            """
-            SELECT
-                p.id                AS pending_id,
-                e.id                AS envio_id,
-                e.monto             AS monto_envio,
-                GROUP_CONCAT(DISTINCT ep.pais) AS paises_envio,
-                r.id                AS recepcion_id,
-                r.monto             AS monto_recepcion,
-                GROUP_CONCAT(DISTINCT rp.pais) AS paises_recepcion
-            FROM pendientes p
-            JOIN envios e           ON e.id = p.envio_id
-            JOIN recepciones r      ON r.id = p.recepcion_id
-            LEFT JOIN envio_paises  ep ON ep.envio_id    = e.id
-            LEFT JOIN recepcion_paises rp ON rp.recepcion_id = r.id
-            GROUP BY p.id
-            ORDER BY p.id ASC
-            """
-        )
-        return [dict(r) for r in cur.fetchall()]
+        with db.reader() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT
+                    p.id                AS pending_id,
+                    e.id                AS envio_id,
+                    e.monto             AS monto_envio,
+                    e.paises            AS paises_envio,
+                    r.id                AS recepcion_id,
+                    r.monto             AS monto_recepcion,
+                    r.paises            AS paises_recepcion
+                FROM pendientes p
+                JOIN envios e           ON e.id = p.envio_id
+                JOIN recepciones r      ON r.id = p.recepcion_id
+                ORDER BY p.id ASC
+                """
+            )
+            return [dict(r) for r in cur.fetchall()]
     except Exception:
         logging.exception("Error en get_pending_matches")
         return []
@@ -362,28 +664,32 @@ def get_pending_matches() -> list:
 
 def cerrar_concluida(envio_id: int, recepcion_id: int):
     try:
-        cur = db.conn.cursor()
-        fecha = current_datetime()
+        with db.writer() as conn:
+            cur = conn.cursor()
+            fecha = current_datetime()
 
-        cur.execute(
-            "INSERT INTO concluidas (envio_id, recepcion_id, fecha_hora) VALUES (?, ?, ?)",
-            (envio_id, recepcion_id, fecha)
-        )
-        # 1) Guardar en concluidas
-        cur.execute(
-            "INSERT INTO concluidas (envio_id, recepcion_id, fecha_hora) VALUES (?, ?, ?)",
-            (envio_id, recepcion_id, fecha)
-        )
-        # 2) Actualizar estados a NO DISPONIBLE
-        cur.execute("UPDATE envios      SET estado='NO DISPONIBLE' WHERE id=?", (envio_id,))
-        cur.execute("UPDATE recepciones SET estado='NO DISPONIBLE' WHERE id=?", (recepcion_id,))
+            cur.execute(
+                "INSERT INTO concluidas (envio_id, recepcion_id, fecha_hora) VALUES (?, ?, ?)",
+                (envio_id, recepcion_id, fecha)
+            )
+            # 1) Guardar en concluidas
+            cur.execute(
+                "INSERT INTO concluidas (envio_id, recepcion_id, fecha_hora) VALUES (?, ?, ?)",
+                (envio_id, recepcion_id, fecha)
+            )
+            # 2) Actualizar estados a NO DISPONIBLE
+            cur.execute("UPDATE envios      SET estado='NO DISPONIBLE' WHERE id=?", (envio_id,))
+            cur.execute("UPDATE recepciones SET estado='NO DISPONIBLE' WHERE id=?", (recepcion_id,))
 
-        # 3) Remover de pendientes
-        cur.execute(
-            "DELETE FROM pendientes WHERE envio_id=? AND recepcion_id=?",
-            (envio_id, recepcion_id)
-        )
-        db.conn.commit()
+            # 3) Remover de pendientes
+            cur.execute(
+                "DELETE FROM pendientes WHERE envio_id=? AND recepcion_id=?",
+                (envio_id, recepcion_id)
+            )
+            # 4) Eliminar de utilizables los pares que ya no pueden usarse
+            invalidar_utilizables(cur, envio_ids=[envio_id], recepcion_ids=[recepcion_id])
+            conn.commit()
+            refrescar_indice(envio_id, recepcion_id)
     except Exception:
         logging.exception("Error en cerrar_concluida")
 
@@ -391,14 +697,15 @@ def cerrar_concluida(envio_id: int, recepcion_id: int):
 
 def cerrar_match_ui(match_id: int) -> str:
     try:
-        cur = db.conn.cursor()
-        cur.execute("SELECT envio_id, recepcion_id FROM pendientes WHERE id = ?", (match_id,))
-        row = cur.fetchone()
-        if not row:
-            return f"Pendiente {match_id} no encontrado."
-        enviar, recep = row['envio_id'], row['recepcion_id']
-        cerrar_concluida(enviar, recep)
-        return f"Match pendiente {match_id} cerrado y movido a concluidas."
+        with db.writer() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT envio_id, recepcion_id FROM pendientes WHERE id = ?", (match_id,))
+            row = cur.fetchone()
+            if not row:
+                return f"Pendiente {match_id} no encontrado."
+            enviar, recep = row['envio_id'], row['recepcion_id']
+            cerrar_concluida(enviar, recep)
+            return f"Match pendiente {match_id} cerrado y movido a concluidas."
     except Exception:
         logging.exception("Error en cerrar_match_ui")
         return f"Error al cerrar match pendiente {match_id}."
@@ -406,106 +713,239 @@ def cerrar_match_ui(match_id: int) -> str:
 # ——————————————————————————————
 # Generación de Reportes (adaptar según nuevo esquema)
 # ——————————————————————————————
-def generate_pdf_report_ui(mes: int) -> str:
+# Filas por tabla del PDF: cada Table entra en una página, así reportlab no
+# tiene que partir tablas gigantes y el cursor se lee por tramos.
+FILAS_POR_TABLA = 40
+# Flowables pendientes que se mantienen en memoria durante doc.build
+VENTANA_FLOWABLES = 20
+
+
+class _FlowablesPerezosos(list):
     """
-    Genera un PDF con envíos, recepciones y matches concluidos del mes/año dado.
-    Verifica primero si hay datos; si no, informa y no genera PDF.
-    Nombre: reporte_AAAA_MM.pdf y se abre automáticamente.
+    Lista de flowables que se rellena desde un generador a medida que
+    doc.build la consume (doc.build hace `del flowables[0]` por cada uno),
+    así nunca hay más de `ventana` flowables construidos a la vez.
     """
-    import os
-    import subprocess
-    from datetime import datetime
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table
-    from reportlab.lib.styles import getSampleStyleSheet
-    from backend.operations import fetch_paises_envio, fetch_paises_recepcion
 
-    año = datetime.now().year
-    mes_str = f"{mes:02d}"
-    filename = f"reporte_{año}_{mes_str}.pdf"
+    def __init__(self, generador, ventana: int = VENTANA_FLOWABLES):
+        super().__init__()
+        self._generador = generador
+        self._ventana = ventana
+        self._rellenar()
 
-    try:
-        cur = db.conn.cursor()
+    def _rellenar(self):
+        while self._generador is not None and len(self) < self._ventana:
+            try:
+                self.append(next(self._generador))
+            except StopIteration:
+                self._generador = None
 
-        # --- 1) Consultas ---
-        # Envíos
-        cur.execute(
-            "SELECT e.id, e.monto, e.fecha_hora, GROUP_CONCAT(ep.pais) AS paises "
-            "FROM envios e "
-            "LEFT JOIN envio_paises ep ON ep.envio_id = e.id "
-            "WHERE strftime('%m', e.fecha_hora)=? "
-            "GROUP BY e.id",
-            (mes_str,)
-        )
-        envs = cur.fetchall()
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._rellenar()
 
-        # Recepciones
-        cur.execute(
-            "SELECT r.id, r.monto, r.fecha_hora, GROUP_CONCAT(rp.pais) AS paises "
-            "FROM recepciones r "
-            "LEFT JOIN recepcion_paises rp ON rp.recepcion_id = r.id "
-            "WHERE strftime('%m', r.fecha_hora)=? "
-            "GROUP BY r.id",
-            (mes_str,)
-        )
-        recs = cur.fetchall()
 
-        # Concluidas
-        cur.execute(
-            "SELECT envio_id, recepcion_id, fecha_hora "
-            "FROM concluidas "
-            "WHERE strftime('%m', fecha_hora)=?",
-            (mes_str,)
+def rango_mes(año: int, mes: int) -> tuple:
+    """
+    Intervalo semiabierto [desde, hasta) de fecha_hora para el mes dado.
+    Comparar contra strings 'AAAA-MM-DD …' permite usar el índice de fecha_hora.
+    """
+    siguiente = (año + 1, 1) if mes == 12 else (año, mes + 1)
+    return f"{año:04d}-{mes:02d}-01", f"{siguiente[0]:04d}-{siguiente[1]:02d}-01"
+
+
+def get_report_years() -> list:
+    """
+    Años con operaciones o concluidas (más el actual), del más reciente al más
+    antiguo. Usa MIN/MAX sobre los índices de fecha_hora.
+    """
+    actual = datetime.now().year
+    try:
+        with db.reader() as conn:
+            extremos = [
+                conn.execute(f"SELECT MIN(fecha_hora), MAX(fecha_hora) FROM {tabla}").fetchone()
+                for tabla in ("envios", "recepciones", "concluidas")
+            ]
+        fechas = [f for fila in extremos for f in fila if f]
+        if not fechas:
+            return [actual]
+        desde = min(int(min(fechas)[:4]), actual)
+        hasta = max(int(max(fechas)[:4]), actual)
+        return list(range(hasta, desde - 1, -1))
+    except Exception:
+        logging.exception("Error en get_report_years")
+        return [actual]
+
+
+def _tablas_por_tramos(cur, encabezado: list, celdas):
+    """Lee el cursor de a FILAS_POR_TABLA filas y devuelve una Table por tramo."""
+    from reportlab.platypus import Table
+    while True:
+        filas = cur.fetchmany(FILAS_POR_TABLA)
+        if not filas:
+            return
+        yield Table([encabezado] + [celdas(f) for f in filas], hAlign='LEFT', repeatRows=1)
+
+
+def _flowables_reporte(conn, desde: str, hasta: str, styles):
+    """Secciones del reporte mensual, generadas a medida que se leen de la BD."""
+    from reportlab.platypus import Paragraph
+
+    # Envíos y recepciones: los países salen de la columna `paises`
+    for titulo, tabla in (("Envíos", "envios"), ("Recepciones", "recepciones")):
+        yield Paragraph(titulo, styles['Heading2'])
+        cur = conn.execute(
+            f"SELECT id, monto, fecha_hora, paises FROM {tabla} "
+            f"WHERE fecha_hora >= ? AND fecha_hora < ? ORDER BY id",
+            (desde, hasta)
+        )
+        yield from _tablas_por_tramos(
+            cur, ["ID", "Monto", "Fecha", "Países"],
+            lambda o: [o["id"], f"${o["monto"]:.2f}", o["fecha_hora"], o["paises"] or "N/A"]
         )
-        concl = cur.fetchall()
 
-        # --- 2) Verificar datos ---
-        if not envs and not recs and not concl:
-            return f"No hay datos ni matches concluidos para {mes_str}/{año}. PDF no generado."
+    # Matches concluidos: países en común resueltos en la misma consulta
+    # (GROUP BY evita duplicados de concluidas)
+    yield Paragraph("Matches Concluidos", styles['Heading2'])
+    cur = conn.execute(
+        """
+        SELECT c.envio_id, c.recepcion_id, MIN(c.fecha_hora) AS fecha_hora,
+               (SELECT group_concat(pais, ', ') FROM (
+                    SELECT DISTINCT ep.pais
+                    FROM envio_paises ep
+                    JOIN recepcion_paises rp
+                      ON rp.recepcion_id = c.recepcion_id AND rp.pais = ep.pais
+                    WHERE ep.envio_id = c.envio_id
+                    ORDER BY ep.pais
+               )) AS comunes
+        FROM concluidas c
+        WHERE c.fecha_hora >= ? AND c.fecha_hora < ?
+        GROUP BY c.envio_id, c.recepcion_id
+        ORDER BY c.envio_id, c.recepcion_id
+        """,
+        (desde, hasta)
+    )
+    yield from _tablas_por_tramos(
+        cur, ["ID Envío", "ID Recepción", "Fecha", "País Operativo"],
+        lambda c: [c["envio_id"], c["recepcion_id"], c["fecha_hora"], c["comunes"] or "N/A"]
+    )
+
+
+# Reportes ya generados: (año, mes) -> (versión de datos del mes, ruta del PDF).
+# Si la versión no cambió desde entonces, el PDF sigue valiendo y no se rearma.
+_cache_reportes = {}
+_cache_reportes_lock = threading.Lock()
+
+
+def version_datos_mes(conn, año: int, mes: int) -> int:
+    """Versión de datos del mes (la incrementan los triggers de la migración 4)."""
+    fila = conn.execute(
+        "SELECT version FROM reporte_versiones WHERE mes = ?", (f"{año:04d}-{mes:02d}",)
+    ).fetchone()
+    return fila[0] if fila else 0
+
+
+class ReporteCancelado(Exception):
+    """Se pidió cancelar el reporte mientras se generaba."""
+
+
+def _paginas_estimadas(conn, desde: str, hasta: str) -> int:
+    """Cantidad aproximada de páginas: una tabla de FILAS_POR_TABLA filas por página."""
+    paginas = 0
+    for tabla in ("envios", "recepciones", "concluidas"):
+        filas = conn.execute(
+            f"SELECT COUNT(*) FROM {tabla} WHERE fecha_hora >= ? AND fecha_hora < ?",
+            (desde, hasta)
+        ).fetchone()[0]
+        paginas += -(-filas // FILAS_POR_TABLA)
+    return max(paginas, 1)
+
+
+def _construir_reporte(año: int, mes: int, filename: str, avisar, avance_reportlab) -> bool:
+    """
+    Arma en `filename` el PDF de envíos, recepciones y matches concluidos del mes.
+    Verifica primero si hay datos; si no hay, devuelve False sin generar nada.
+    Las filas pasan del cursor a las tablas por tramos, sin cargar el mes entero.
+    """
+    from reportlab.platypus import SimpleDocTemplate
+    from reportlab.lib.styles import getSampleStyleSheet
 
-        # --- 3) Construir PDF ---
-        doc = SimpleDocTemplate(filename)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Sección Envios
-        elements.append(Paragraph("Envíos", styles['Heading2']))
-        tabla_envs = [["ID","Monto","Fecha","Países"]]
-        tabla_envs += [[e["id"], f"${e["monto"]:.2f}", e["fecha_hora"], e["paises"] or "N/A"] for e in envs]
-        elements.append(Table(tabla_envs, hAlign='LEFT'))
-
-        # Sección Recepciones
-        elements.append(Paragraph("Recepciones", styles['Heading2']))
-        tabla_recs = [["ID","Monto","Fecha","Países"]]
-        tabla_recs += [[r["id"], f"${r["monto"]:.2f}", r["fecha_hora"], r["paises"] or "N/A"] for r in recs]
-        elements.append(Table(tabla_recs, hAlign='LEFT'))
-
-                # Sección Matches Concluidos
-        elements.append(Paragraph("Matches Concluidos", styles['Heading2']))
-        tabla_conc = [["ID Envío","ID Recepción","Fecha","País Operativo"]]
-        # Usamos GROUP BY para evitar duplicados
-        cur.execute(
+    desde, hasta = rango_mes(año, mes)
+    with db.reader() as conn:
+        # --- 1) Verificar datos ---
+        hay_datos = conn.execute(
             """
-            SELECT envio_id, recepcion_id, MIN(fecha_hora) AS fecha_hora
-            FROM concluidas
-            WHERE strftime('%m', fecha_hora)=?
-            GROUP BY envio_id, recepcion_id
+            SELECT EXISTS(SELECT 1 FROM envios      WHERE fecha_hora >= ?1 AND fecha_hora < ?2)
+                OR EXISTS(SELECT 1 FROM recepciones WHERE fecha_hora >= ?1 AND fecha_hora < ?2)
+                OR EXISTS(SELECT 1 FROM concluidas  WHERE fecha_hora >= ?1 AND fecha_hora < ?2)
             """,
-            (mes_str,)
-        )
-        concl = cur.fetchall()
-        for c in concl:
-            eid, rid = c["envio_id"], c["recepcion_id"]
-            pe = set(fetch_paises_envio(eid))
-            pr = set(fetch_paises_recepcion(rid))
-            comunes = ", ".join(sorted(pe & pr)) or "N/A"
-            tabla_conc.append([eid, rid, c["fecha_hora"], comunes])
-        elements.append(Table(tabla_conc, hAlign='LEFT'))
+            (desde, hasta)
+        ).fetchone()[0]
+        if not hay_datos:
+            return False
+        avisar("consulta", _paginas_estimadas(conn, desde, hasta))
+
+        # --- 2) Construir PDF (las consultas se leen mientras se arma) ---
+        doc = SimpleDocTemplate(filename)
+        doc.setProgressCallBack(avance_reportlab)
+        styles = getSampleStyleSheet()
+        doc.build(_FlowablesPerezosos(_flowables_reporte(conn, desde, hasta, styles)))
+    return True
+
+
+def generate_pdf_report_ui(mes: int, año: int = None, progreso=None, cancelado=None) -> str:
+    """
+    Genera un PDF con envíos, recepciones y matches concluidos del mes/año dado
+    (por defecto el año actual). Si no hay datos, informa y no genera PDF.
+    Nombre: reporte_AAAA_MM.pdf y se abre automáticamente.
+    Si el mes no cambió desde el último reporte (misma versión de datos y el
+    archivo sigue ahí), se abre ese PDF sin volver a consultar ni armar nada.
+
+    `progreso(etapa, valor)` recibe los avances: ("consulta", páginas estimadas)
+    al terminar la verificación, ("pagina", n) por cada página armada y
+    ("abriendo", archivo) al final. Si `cancelado()` devuelve True se corta
+    la construcción en el próximo avance y no se abre nada.
+    """
+    import os
+    import sys
+    import subprocess
+    from datetime import datetime
+
+    año = año or datetime.now().year
+    mes_str = f"{mes:02d}"
+    filename = os.path.abspath(f"reporte_{año}_{mes_str}.pdf")
 
+    def avisar(etapa, valor):
+        if cancelado and cancelado():
+            raise ReporteCancelado()
+        if progreso:
+            progreso(etapa, valor)
 
-        # Generar
-        doc.build(elements)
+    def avance_reportlab(tipo, valor):
+        # reportlab avisa por flowable (PROGRESS) y por página (PAGE)
+        if tipo == 'PAGE':
+            avisar("pagina", valor)
+        elif cancelado and cancelado():
+            raise ReporteCancelado()
 
-        # --- 4) Abrir automáticamente ---
+    try:
+        # --- 0) ¿Ya se generó con estos mismos datos? ---
+        # La versión se lee antes de consultar: si algo se escribe mientras se
+        # arma, la entrada queda vieja y el próximo pedido lo vuelve a generar.
+        with db.reader() as conn:
+            version = version_datos_mes(conn, año, mes)
+        with _cache_reportes_lock:
+            en_cache = _cache_reportes.get((año, mes))
+        reutilizado = en_cache == (version, filename) and os.path.exists(filename)
+
+        if not reutilizado:
+            if not _construir_reporte(año, mes, filename, avisar, avance_reportlab):
+                return f"No hay datos ni matches concluidos para {mes_str}/{año}. PDF no generado."
+            with _cache_reportes_lock:
+                _cache_reportes[(año, mes)] = (version, filename)
+
+        # --- 3) Abrir automáticamente ---
+        avisar("abriendo", filename)
         if os.name == 'nt':  # Windows
             os.startfile(filename)
         else:
@@ -516,8 +956,13 @@ def generate_pdf_report_ui(mes: int) -> str:
             except Exception:
                 pass
 
-        return f"PDF generado y abierto: {os.path.abspath(filename)}"
+        if reutilizado:
+            return f"PDF sin cambios desde el último reporte, abierto: {filename}"
+        return f"PDF generado y abierto: {filename}"
 
+    except ReporteCancelado:
+        logging.info(f"Reporte {mes_str}/{año} cancelado.")
+        return f"Reporte {mes_str}/{año} cancelado."
     except Exception:
         logging.exception("Error generando PDF")
         return "Error al generar el PDF"
@@ -529,42 +974,51 @@ def modify_operacion_ui(op_id: int, new_monto_str: str, new_countries_str: str)
     Actualiza monto y países de la operación (envío o recepción) con ID op_id.
     """
     try:
-        cur = db.conn.cursor()
-        # ¿Es envío?
-        cur.execute("SELECT id FROM envios WHERE id = ?", (op_id,))
-        if cur.fetchone():
-            # Actualizar monto si se indicó
-            if new_monto_str:
-                monto = float(new_monto_str)
-                cur.execute("UPDATE envios SET monto = ? WHERE id = ?", (monto, op_id))
-            # Actualizar países si se indicó
-            if new_countries_str.strip():
-                cur.execute("DELETE FROM envio_paises WHERE envio_id = ?", (op_id,))
-                for pais in split_countries_list(new_countries_str):
-                    cur.execute(
-                        "INSERT INTO envio_paises (envio_id, pais) VALUES (?, ?)",
-                        (op_id, pais)
-                    )
-        else:
-            # ¿Es recepción?
-            cur.execute("SELECT id FROM recepciones WHERE id = ?", (op_id,))
-            if cur.fetchone():
+        with db.writer() as conn:
+            cur = conn.cursor()
+            # ¿Es envío?
+            cur.execute("SELECT id FROM envios WHERE id = ?", (op_id,))
+            es_envio = cur.fetchone() is not None
+            if es_envio:
+                # Actualizar monto si se indicó
                 if new_monto_str:
                     monto = float(new_monto_str)
-                    cur.execute("UPDATE recepciones SET monto = ? WHERE id = ?", (monto, op_id))
+                    cur.execute("UPDATE envios SET monto = ? WHERE id = ?", (monto, op_id))
+                # Actualizar países si se indicó
                 if new_countries_str.strip():
-                    cur.execute("DELETE FROM recepcion_paises WHERE recepcion_id = ?", (op_id,))
-                    for pais in split_countries_list(new_countries_str):
+                    paises = split_countries_list(new_countries_str)
+                    cur.execute("DELETE FROM envio_paises WHERE envio_id = ?", (op_id,))
+                    for pais in paises:
                         cur.execute(
-                            "INSERT INTO recepcion_paises (recepcion_id, pais) VALUES (?, ?)",
+                            "INSERT INTO envio_paises (envio_id, pais) VALUES (?, ?)",
                             (op_id, pais)
                         )
             else:
-                return f"Operación {op_id} no encontrada."
-        db.conn.commit()
-        # Recalculamos matches si hace falta
-        auto_match_pairings()
-        return f"Operación {op_id} modificada exitosamente."
+                # ¿Es recepción?
+                cur.execute("SELECT id FROM recepciones WHERE id = ?", (op_id,))
+                if cur.fetchone():
+                    if new_monto_str:
+                        monto = float(new_monto_str)
+                        cur.execute("UPDATE recepciones SET monto = ? WHERE id = ?", (monto, op_id))
+                    if new_countries_str.strip():
+                        paises = split_countries_list(new_countries_str)
+                        cur.execute("DELETE FROM recepcion_paises WHERE recepcion_id = ?", (op_id,))
+                        for pais in paises:
+                            cur.execute(
+                                "INSERT INTO recepcion_paises (recepcion_id, pais) VALUES (?, ?)",
+                                (op_id, pais)
+                            )
+                else:
+                    return f"Operación {op_id} no encontrada."
+            conn.commit()
+            # Recalculamos sólo los matches de la operación modificada
+            if es_envio:
+                refrescar_indice(envio_id=op_id)
+                auto_match_pairings(envio_id=op_id)
+            else:
+                refrescar_indice(recepcion_id=op_id)
+                auto_match_pairings(recepcion_id=op_id)
+            return f"Operación {op_id} modificada exitosamente."
     except Exception:
         logging.exception("Error en modify_operacion_ui")
         return f"Error modificando operación {op_id}."
@@ -574,54 +1028,55 @@ def get_last_operations(tipo: str, limit: int = 10) -> list:
     Devuelve las últimas `limit` operaciones de tipo 'envio' o 'recepcion',
     con sus IDs, montos y países concatenados.
     """
-    cur = db.conn.cursor()
-    if tipo.lower() == "envio":
-        cur.execute(
-            """
-            SELECT
-              e.id          AS NumeroOperacion,
-              e.monto       AS Monto,
-              GROUP_CONCAT(ep.pais) AS PaisEnvio,
-              e.fecha_hora
-            FROM envios e
-            LEFT JOIN envio_paises ep ON ep.envio_id = e.id
-            GROUP BY e.id
-            ORDER BY e.id DESC
-            LIMIT ?
-            """,
-            (limit,)
-        )
-    else:  # recepcion
-        cur.execute(
-            """
-            SELECT
-              r.id          AS NumeroOperacion,
-              r.monto       AS Monto,
-              GROUP_CONCAT(rp.pais) AS PaisRecepcion,
-              r.fecha_hora
-            FROM recepciones r
-            LEFT JOIN recepcion_paises rp ON rp.recepcion_id = r.id
-            GROUP BY r.id
-            ORDER BY r.id DESC
-            LIMIT ?
-            """,
-            (limit,)
-        )
-    return [dict(r) for r in cur.fetchall()]
+    with db.reader() as conn:
+        cur = conn.cursor()
+        if tipo.lower() == "envio":
+            cur.execute(
+                """
+                SELECT
+                  e.id          AS NumeroOperacion,
+                  e.monto       AS Monto,
+                  e.paises      AS PaisEnvio,
+                  e.fecha_hora
+                FROM envios e
+                ORDER BY e.id DESC
+                LIMIT ?
+                """,
+                (limit,)
+            )
+        else:  # recepcion
+            cur.execute(
+                """
+                SELECT
+                  r.id          AS NumeroOperacion,
+                  r.monto       AS Monto,
+                  r.paises      AS PaisRecepcion,
+                  r.fecha_hora
+                FROM recepciones r
+                ORDER BY r.id DESC
+                LIMIT ?
+                """,
+                (limit,)
+            )
+        return [dict(r) for r in cur.fetchall()]
 
 def reactivate_pending(envio_id: int, recepcion_id: int):
     """
-    Elimina el match de 'pendientes' y marca envío/recepción como DISPONIBLE.
+    Elimina el match de 'pendientes', marca envío/recepción como DISPONIBLE
+    y vuelve a calcular sus matches utilizables.
     """
     try:
-        cur = db.conn.cursor()
-        cur.execute(
-            "DELETE FROM pendientes WHERE envio_id=? AND recepcion_id=?",
-            (envio_id, recepcion_id)
-        )
-        cur.execute("UPDATE envios      SET estado='DISPONIBLE' WHERE id=?", (envio_id,))
-        cur.execute("UPDATE recepciones SET estado='DISPONIBLE' WHERE id=?", (recepcion_id,))
-        db.conn.commit()
+        with db.writer() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "DELETE FROM pendientes WHERE envio_id=? AND recepcion_id=?",
+                (envio_id, recepcion_id)
+            )
+            cur.execute("UPDATE envios      SET estado='DISPONIBLE' WHERE id=?", (envio_id,))
+            cur.execute("UPDATE recepciones SET estado='DISPONIBLE' WHERE id=?", (recepcion_id,))
+            conn.commit()
+            refrescar_indice(envio_id, recepcion_id)
+            auto_match_pairings(envio_id=envio_id, recepcion_id=recepcion_id)
     except Exception:
         logging.exception("Error en reactivate_pending")
 
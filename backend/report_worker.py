@@ -0,0 +1,115 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from backend import operations
+
+# ——————————————————————————————
+# Generación de reportes en segundo plano
+# ——————————————————————————————
+# Un hilo propio (no el de BD): el reporte sólo lee por el pool de lectores,
+# así las altas y el matching no esperan a reportlab. Con un único hilo sólo
+# se arma un reporte a la vez; los pedidos de otros meses quedan en cola.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reporte")
+_lock = threading.RLock()   # reentrante: add_done_callback puede correr en el acto
+_trabajos = {}   # (año, mes) -> TrabajoReporte pendiente o en curso
+
+
+class TrabajoReporte:
+    """Un reporte pedido: su Future, los oyentes de progreso y el pedido de cancelación."""
+
+    def __init__(self, año: int, mes: int):
+        self.año = año
+        self.mes = mes
+        self.future = None
+        self.ultimo_avance = None   # (etapa, valor) más reciente
+        self._oyentes = []
+        self._cancelar = threading.Event()
+        self._lock = threading.Lock()
+
+    def agregar_oyente(self, oyente):
+        """
+        Registra `oyente(trabajo, etapa, valor)`; si ya hubo avances recibe
+        el último enseguida. Registrar dos veces el mismo oyente no lo duplica.
+        """
+        with self._lock:
+            if oyente in self._oyentes:
+                return
+            self._oyentes.append(oyente)
+            ultimo = self.ultimo_avance
+        if ultimo:
+            oyente(self, *ultimo)
+
+    def _avisar(self, etapa, valor):
+        with self._lock:
+            self.ultimo_avance = (etapa, valor)
+            oyentes = list(self._oyentes)
+        for oyente in oyentes:
+            try:
+                oyente(self, etapa, valor)
+            except Exception:
+                logging.exception("Error en oyente de progreso del reporte")
+
+    def cancelar(self):
+        """Pide cortar el reporte; si todavía estaba en cola, no llega a empezar."""
+        self._cancelar.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def cancelado(self) -> bool:
+        return self._cancelar.is_set()
+
+
+def _ejecutar(trabajo: TrabajoReporte) -> str:
+    trabajo._avisar("inicio", None)
+    return operations.generate_pdf_report_ui(
+        trabajo.mes, trabajo.año,
+        progreso=trabajo._avisar,
+        cancelado=trabajo.cancelado,
+    )
+
+
+def _terminado(trabajo: TrabajoReporte, _future):
+    with _lock:
+        if _trabajos.get((trabajo.año, trabajo.mes)) is trabajo:
+            del _trabajos[(trabajo.año, trabajo.mes)]
+
+
+def solicitar(mes: int, año: int = None, oyente=None) -> TrabajoReporte:
+    """
+    Encola el reporte de mes/año (por defecto el año actual) y devuelve su
+    trabajo. Si ese mismo mes ya está en cola o armándose, se devuelve el
+    trabajo existente en lugar de generarlo dos veces.
+    """
+    año = año or datetime.now().year
+    with _lock:
+        trabajo = _trabajos.get((año, mes))
+        if trabajo is None or trabajo.cancelado():
+            trabajo = TrabajoReporte(año, mes)
+            if oyente:
+                trabajo.agregar_oyente(oyente)
+            _trabajos[(año, mes)] = trabajo
+            trabajo.future = _executor.submit(_ejecutar, trabajo)
+            trabajo.future.add_done_callback(lambda f: _terminado(trabajo, f))
+            return trabajo
+    if oyente:
+        trabajo.agregar_oyente(oyente)
+    return trabajo
+
+
+def cancelar_todos():
+    """Cancela el reporte en curso y los que estén en cola."""
+    with _lock:
+        trabajos = list(_trabajos.values())
+    for trabajo in trabajos:
+        trabajo.cancelar()
+
+
+def shutdown(wait: bool = True):
+    """Cancela lo pendiente y detiene el hilo de reportes."""
+    try:
+        cancelar_todos()
+        _executor.shutdown(wait=wait, cancel_futures=True)
+    except Exception:
+        logging.exception("Error deteniendo el hilo de reportes")
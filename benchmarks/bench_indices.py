@@ -0,0 +1,133 @@
+"""
+Benchmark de las consultas frecuentes antes y después de los índices
+secundarios (migración 1 de backend/db_manager.py). Para las consultas
+que además cambiaron de algoritmo (ALGORITMOS_ANTES), "antes" corre el
+algoritmo original sobre el esquema sin índices.
+
+Uso:  python benchmarks/bench_indices.py [cantidad_operaciones]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.db_manager import DatabaseManager
+
+PAISES = ["ARGENTINA", "USA", "CHILE", "PERU", "BRASIL", "MEXICO", "URUGUAY", "ESPAÑA"]
+
+CONSULTAS = {
+    "fetch_paises_envio": (
+        "SELECT pais FROM envio_paises WHERE envio_id=?",
+        lambda n: (random.randint(1, n),),
+    ),
+    "fetch_paises_recepcion": (
+        "SELECT pais FROM recepcion_paises WHERE recepcion_id=?",
+        lambda n: (random.randint(1, n),),
+    ),
+    "check_duplicate_operation": (
+        "SELECT 1 FROM envios WHERE monto = ? AND paises_firma = ? LIMIT 1",
+        lambda n: (float(random.randint(1, 5000) * 100), "CHILE,USA"),
+    ),
+    "envios DISPONIBLES": (
+        "SELECT * FROM envios WHERE estado='DISPONIBLE'",
+        lambda n: (),
+    ),
+    "concluidas por fecha": (
+        "SELECT envio_id, recepcion_id FROM concluidas WHERE fecha_hora >= ? AND fecha_hora < ?",
+        lambda n: ("2024-03-01", "2024-04-01"),
+    ),
+}
+
+
+def _duplicado_original(conn, monto, firma):
+    """check_duplicate_operation original: una consulta de países por cada envío con ese monto."""
+    paises_in = set(firma.split(","))
+    for (eid,) in conn.execute("SELECT id FROM envios WHERE monto = ?", (monto,)).fetchall():
+        existentes = {r[0] for r in conn.execute("SELECT pais FROM envio_paises WHERE envio_id = ?", (eid,))}
+        if existentes == paises_in:
+            return True
+    return False
+
+
+# Consulta -> función(conn, *params) con el algoritmo previo a la optimización
+ALGORITMOS_ANTES = {
+    "check_duplicate_operation": _duplicado_original,
+}
+
+
+def poblar(db, n):
+    cur = db.conn.cursor()
+    for tabla, tabla_paises, fk in (("envios", "envio_paises", "envio_id"),
+                                    ("recepciones", "recepcion_paises", "recepcion_id")):
+        cur.executemany(
+            f"INSERT INTO {tabla} (monto, estado, fecha_hora) VALUES (?, ?, ?)",
+            [
+                (float(random.randint(1, 5000) * 100),
+                 "DISPONIBLE" if random.random() < 0.1 else "NO DISPONIBLE",
+                 f"202{random.randint(2, 5)}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d} 12:00:00")
+                for _ in range(n)
+            ],
+        )
+        cur.executemany(
+            f"INSERT INTO {tabla_paises} ({fk}, pais) VALUES (?, ?)",
+            [(i, p) for i in range(1, n + 1) for p in random.sample(PAISES, random.randint(1, 3))],
+        )
+    cur.executemany(
+        "INSERT INTO concluidas (envio_id, recepcion_id, fecha_hora) VALUES (?, ?, ?)",
+        [(i, i, f"202{random.randint(2, 5)}-{random.randint(1, 12):02d}-15 12:00:00") for i in range(1, n + 1)],
+    )
+    db.conn.commit()
+
+
+def medir(db, n, repeticiones=200, antes=False):
+    tiempos = {}
+    for nombre, (sql, params) in CONSULTAS.items():
+        random.seed(0)
+        algoritmo = ALGORITMOS_ANTES.get(nombre) if antes else None
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            if algoritmo:
+                algoritmo(db.conn, *params(n))
+            else:
+                db.conn.execute(sql, params(n)).fetchall()
+        tiempos[nombre] = (time.perf_counter() - inicio) / repeticiones * 1000
+    return tiempos
+
+
+def quitar_indices(db):
+    cur = db.conn.cursor()
+    nombres = [r[0] for r in cur.execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'"
+    ).fetchall()]
+    for nombre in nombres:
+        cur.execute(f"DROP INDEX {nombre}")
+    cur.execute("PRAGMA user_version = 0")
+    db.conn.commit()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.sqlite"))
+        poblar(db, n)
+
+        # Esquema "viejo": sin índices y con user_version = 0
+        quitar_indices(db)
+        antes = medir(db, n, antes=True)
+        # Migración como la que corre al iniciar la app sobre un db.sqlite existente
+        db.migrate()
+        despues = medir(db, n)
+        db.close()
+
+    print(f"Operaciones por tabla: {n}")
+    print(f"{'consulta':<28}{'antes (ms)':>12}{'después (ms)':>14}{'mejora':>9}")
+    for nombre in CONSULTAS:
+        a, d = antes[nombre], despues[nombre]
+        print(f"{nombre:<28}{a:>12.3f}{d:>14.3f}{a / d if d else float('inf'):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
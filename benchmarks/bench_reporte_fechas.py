@@ -0,0 +1,90 @@
+"""
+Benchmark de los filtros de fecha del reporte mensual: strftime('%m', …)=?
+(escaneo completo, mezcla todos los años) contra el rango semiabierto
+fecha_hora >= ? AND fecha_hora < ? (usa el índice de fecha_hora).
+
+Uso:  python benchmarks/bench_reporte_fechas.py [operaciones_por_tabla] [años]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.db_manager import DatabaseManager
+
+AÑO_FINAL = 2025
+MES = 3
+
+# nombre -> (consulta con strftime, consulta con rango)
+CONSULTAS = {
+    "envios del mes": (
+        "SELECT id, monto, fecha_hora, paises FROM envios WHERE strftime('%m', fecha_hora)=?",
+        "SELECT id, monto, fecha_hora, paises FROM envios WHERE fecha_hora >= ? AND fecha_hora < ?",
+    ),
+    "recepciones del mes": (
+        "SELECT id, monto, fecha_hora, paises FROM recepciones WHERE strftime('%m', fecha_hora)=?",
+        "SELECT id, monto, fecha_hora, paises FROM recepciones WHERE fecha_hora >= ? AND fecha_hora < ?",
+    ),
+    "concluidas del mes": (
+        "SELECT envio_id, recepcion_id, fecha_hora FROM concluidas WHERE strftime('%m', fecha_hora)=?",
+        "SELECT envio_id, recepcion_id, fecha_hora FROM concluidas WHERE fecha_hora >= ? AND fecha_hora < ?",
+    ),
+    "¿hay datos? (EXISTS)": (
+        "SELECT EXISTS(SELECT 1 FROM envios WHERE strftime('%m', fecha_hora)=?)",
+        "SELECT EXISTS(SELECT 1 FROM envios WHERE fecha_hora >= ? AND fecha_hora < ?)",
+    ),
+}
+
+
+def fecha_al_azar(años):
+    return (f"{random.randint(AÑO_FINAL - años + 1, AÑO_FINAL)}-{random.randint(1, 12):02d}-"
+            f"{random.randint(1, 28):02d} {random.randint(0, 23):02d}:00:00")
+
+
+def poblar(db, n, años):
+    cur = db.conn.cursor()
+    for tabla in ("envios", "recepciones"):
+        cur.executemany(
+            f"INSERT INTO {tabla} (monto, estado, fecha_hora, paises) VALUES (?, 'NO DISPONIBLE', ?, 'USA')",
+            [(float(random.randint(1, 5000) * 100), fecha_al_azar(años)) for _ in range(n)],
+        )
+    cur.executemany(
+        "INSERT INTO concluidas (envio_id, recepcion_id, fecha_hora) VALUES (?, ?, ?)",
+        [(i, i, fecha_al_azar(años)) for i in range(1, n + 1)],
+    )
+    db.conn.commit()
+
+
+def medir(db, sql, params, repeticiones=20):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        filas = db.conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - inicio) / repeticiones * 1000, len(filas)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    años = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    random.seed(42)
+    desde = f"{AÑO_FINAL}-{MES:02d}-01"
+    hasta = f"{AÑO_FINAL}-{MES + 1:02d}-01"
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.sqlite"))
+        poblar(db, n, años)
+        db.conn.execute("ANALYZE")
+
+        print(f"Operaciones por tabla: {n}, años: {AÑO_FINAL - años + 1}-{AÑO_FINAL}, mes: {MES:02d}/{AÑO_FINAL}")
+        print(f"{'consulta':<24}{'strftime (ms)':>14}{'filas':>8}{'rango (ms)':>12}{'filas':>8}{'mejora':>9}")
+        for nombre, (sql_mes, sql_rango) in CONSULTAS.items():
+            t_mes, filas_mes = medir(db, sql_mes, (f"{MES:02d}",))
+            t_rango, filas_rango = medir(db, sql_rango, (desde, hasta))
+            print(f"{nombre:<24}{t_mes:>14.3f}{filas_mes:>8}{t_rango:>12.3f}{filas_rango:>8}"
+                  f"{t_mes / t_rango if t_rango else float('inf'):>8.1f}x")
+        db.close()
+    print("strftime devuelve el mes de todos los años; el rango sólo el del año pedido.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,14 @@
 import sys, os
 import logging
+import multiprocessing
+
+if __name__ == "__main__":
+    # En el ejecutable congelado (PyInstaller) cada worker del rescan paralelo
+    # relanza este script: freeze_support() lo atiende y termina ahí, antes de
+    # importar Kivy y abrir otra ventana.
+    multiprocessing.freeze_support()
+
+from collections import deque
 from logging.handlers import RotatingFileHandler
 from kivy.core.window import Window
 import custom_widgets
@@ -48,7 +57,8 @@ from screens.swipe_matches import SwipeMatches
 
 # Importar módulos de backend (ahora usando SQLite)
 from backend import operations
-from backend.operations import fetch_paises_envio, fetch_paises_recepcion
+from backend import db_worker
+from backend import report_worker
 
 
 # Componentes personalizados y utilidades
@@ -66,6 +76,11 @@ from kivymd.uix.list import OneLineListItem, OneLineIconListItem, IconLeftWidget
 from kivymd.uix.card import MDCard
 from kivy.app import App
 
+# Cola de bloques {envio, candidatas} precalculados para el swipe:
+# tamaño objetivo y mínimo a partir del cual se recarga en segundo plano
+PREFETCH_BLOQUES = 5
+PREFETCH_MINIMO = 2
+
 # Función helper para centrar menús
 def center_menu(menu):
     menu.pos = ((Window.width - menu.width) / 2, (Window.height - menu.height) / 2)
@@ -215,20 +230,24 @@ class SwipeCard(RelativeLayout):
             if not self.match_data or "MatchID" not in self.match_data:
                 logging.error("match_data falta la clave 'MatchID' en SwipeCard")
                 return
+            accion = None
             if direction in ["right", "up"]:
                 # Verifica que el parent tenga los ids esperados antes de acceder a ellos.
                 if self.parent and hasattr(self.parent, "ids") and "main_card" in self.parent.ids:
                     if self == self.parent.ids.main_card:
                         from backend.operations import confirm_match_ui
-                        confirm_match_ui(self.match_data["MatchID"])
+                        accion = confirm_match_ui
                 else:
                     # Aquí se puede implementar lógica adicional para matches secundarios.
                     pass
             else:
                 from backend.operations import reject_match_ui
-                reject_match_ui(self.match_data["MatchID"])
-            if hasattr(app, "cargar_matches"):
-                app.cargar_matches()
+                accion = reject_match_ui
+            recargar = (lambda _: app.cargar_matches()) if hasattr(app, "cargar_matches") else None
+            if accion:
+                app.ejecutar_en_segundo_plano(accion, self.match_data["MatchID"], on_done=recargar)
+            elif recargar:
+                recargar(None)
         except Exception as e:
             logging.exception("Error en procesar_swipe de SwipeCard")
 
@@ -321,7 +340,7 @@ class MyApp(MDApp):
     selected_envio_countries = []
     selected_recepcion_countries = []
     operacion_seleccionada = None
-    current_matches = []
+    current_matches = deque()
     current_main_match = None
     title = "Gestor de Matches Oficina"
     icon = "assets/62838.png"
@@ -336,6 +355,11 @@ class MyApp(MDApp):
         # ————————————————————————————————————————————
 
         self.theme_cls.primary_palette = "Blue"
+        # Confirmaciones del swipe aún no terminadas: número de orden -> (envio_id, recepcion_id)
+        self._confirmaciones = {}
+        self._ultima_confirmacion = 0
+        # Reportes pedidos desde la UI cuyo resultado falta mostrar (se quitan en _resultado_pdf)
+        self._trabajos_pdf = []
         sm = ScreenManager()
 
         # 1) Carpeta de KV empaquetados
@@ -374,28 +398,123 @@ class MyApp(MDApp):
     def on_start(self):
         self.update_badge_matches()
 
+    def on_stop(self):
+        # Espera a que el hilo de BD termine lo que tenga encolado
+        db_worker.shutdown()
+        # Los reportes en curso se cancelan en lugar de esperarlos
+        report_worker.shutdown()
+
     def set_focus(self, field_id):
         def focus_callback(dt):
             screen = self.root.current_screen
             if hasattr(screen.ids, field_id):
                 screen.ids[field_id].focus = True
         Clock.schedule_once(focus_callback, 0.1)
-        
+
+    # ----------------------------
+    # Trabajo de BD en segundo plano
+    # ----------------------------
+    def ejecutar_en_segundo_plano(self, fn, *args, on_done=None, cargando=None):
+        """
+        Ejecuta `fn(*args)` en el hilo de BD y entrega el resultado a `on_done`
+        en el hilo de Kivy (vía Clock.schedule_once).
+        Si se indica `cargando`, se muestra ese texto mientras dura el trabajo.
+        """
+        if cargando:
+            self.mostrar_cargando(cargando)
+        future = db_worker.submit(fn, *args)
+        future.add_done_callback(
+            lambda f: Clock.schedule_once(lambda dt: self._entregar_resultado(f, on_done, bool(cargando)))
+        )
+        return future
+
+    def _entregar_resultado(self, future, on_done, con_cargando):
+        if con_cargando:
+            self.ocultar_cargando()
+        try:
+            resultado = future.result()
+        except Exception:
+            logger.exception("Error en trabajo de BD en segundo plano")
+            self.mostrar_dialogo("Error", "Ocurrió un error al acceder a la base de datos.")
+            return
+        if on_done:
+            on_done(resultado)
+
+    def mostrar_cargando(self, texto="Procesando..."):
+        self._cargas_en_curso = getattr(self, "_cargas_en_curso", 0) + 1
+        if getattr(self, "dialog_cargando", None):
+            self.dialog_cargando.title = texto
+            return
+        self.dialog_cargando = MDDialog(title=texto, auto_dismiss=False)
+        self.dialog_cargando.open()
+
+    def ocultar_cargando(self):
+        self._cargas_en_curso = max(getattr(self, "_cargas_en_curso", 1) - 1, 0)
+        if self._cargas_en_curso == 0 and getattr(self, "dialog_cargando", None):
+            self.dialog_cargando.dismiss()
+            self.dialog_cargando = None
+
     def marcar_como_pendiente(self, envio_id: int, recepcion_id: int):
         """
-        Llamada desde el swipe: mueve el par a pendientes y refresca pantallas.
+        Llamada desde el swipe: mueve el par a pendientes. La siguiente carta
+        sale de la cola al instante; sólo se recalculan los bloques afectados.
         """
-        from backend.operations import marcar_pendiente
-        marcar_pendiente(envio_id, recepcion_id)
-        # Recarga matches y actualiza badge
-        self.cargar_matches()
-        self.update_badge_matches()
+        from backend.operations import marcar_pendiente, preparar_bloques_swipe
+        # Lo pedido antes de esta confirmación llega sin enterarse de ella
+        self._ultima_confirmacion += 1
+        orden = self._ultima_confirmacion
+        self._confirmaciones[orden] = (envio_id, recepcion_id)
+        def confirmado(ok):
+            # El hilo de BD es FIFO y los resultados se entregan en orden: todo
+            # lo pedido antes de esta confirmación ya se entregó y lo pedido
+            # después ya la ve. Nadie más necesita filtrarla.
+            self._confirmaciones.pop(orden, None)
+            if not ok:
+                # La carta estaba vieja: alguna de las dos ya no estaba DISPONIBLE
+                self.mostrar_dialogo("Aviso", "El match ya no estaba disponible. Se recargan los matches.")
+                self.cargar_matches()
+            self.update_badge_matches()
+        self.ejecutar_en_segundo_plano(marcar_pendiente, envio_id, recepcion_id, on_done=confirmado)
+
+        # Actualización delta de la cola: el envío y la recepción dejan de estar
+        # DISPONIBLES. Los bloques que perdían una candidata se piden de nuevo
+        # (el hilo de BD es FIFO: se calculan después de marcar_pendiente).
+        afectados = []
+        cola = deque()
+        for bloque in self.current_matches:
+            if bloque["envio"]["id"] == envio_id:
+                continue
+            candidatas = [r for r in bloque["candidatas"] if r["id"] != recepcion_id]
+            if len(candidatas) != len(bloque["candidatas"]):
+                afectados.append(bloque["envio"]["id"])
+                bloque = dict(bloque, candidatas=candidatas)
+            if candidatas:
+                cola.append(bloque)
+        self.current_matches = cola
+        self.rotar_cartas()
+
+        if afectados:
+            generacion = self._generacion_cola
+            marca = self._ultima_confirmacion
+            def reemplazar(bloques):
+                if generacion != self._generacion_cola:
+                    return
+                frescos = {b["envio"]["id"]: b for b in self._sin_confirmados(bloques, marca)}
+                cola = {b["envio"]["id"]: b for b in self.current_matches if b["envio"]["id"] not in afectados}
+                cola.update(frescos)
+                primero = self.current_matches[0]["envio"]["id"] if self.current_matches else None
+                self.current_matches = deque(cola[i] for i in sorted(cola))
+                if not self.current_matches or self.current_matches[0]["envio"]["id"] != primero or primero in frescos:
+                    self.rotar_cartas()
+            self.ejecutar_en_segundo_plano(preparar_bloques_swipe, None, None, afectados, on_done=reemplazar)
 
 
     # Funciones de dropdown para envío, recepción y modificación
     def open_dropdown_envio(self):
         from backend.file_manager import load_available_countries
-        available = load_available_countries()
+        self.ejecutar_en_segundo_plano(load_available_countries, on_done=self._mostrar_dropdown_envio)
+
+    def _mostrar_dropdown_envio(self, available):
         menu_items = [{"text": country} for country in available]
         # Agregamos la opción de Nuevo País
         menu_items.append({"text": "Nuevo País"})
@@ -424,7 +543,9 @@ class MyApp(MDApp):
 
     def open_dropdown_recepcion(self):
         from backend.file_manager import load_available_countries
-        available = load_available_countries()
+        self.ejecutar_en_segundo_plano(load_available_countries, on_done=self._mostrar_dropdown_recepcion)
+
+    def _mostrar_dropdown_recepcion(self, available):
         menu_items = [{"text": country} for country in available]
         menu_items.append({"text": "Nuevo País"})
         caller = self.root.get_screen("add_recepcion").ids.btn_agregar_pais
@@ -445,7 +566,9 @@ class MyApp(MDApp):
 
     def open_dropdown_modificacion(self):
         from backend.file_manager import load_available_countries
-        available = load_available_countries()
+        self.ejecutar_en_segundo_plano(load_available_countries, on_done=self._mostrar_dropdown_modificacion)
+
+    def _mostrar_dropdown_modificacion(self, available):
         menu_items = [{"text": country} for country in available]
         menu_items.append({"text": "Nuevo País"})
         caller = self.root.get_screen("modify_operacion").ids.btn_agregar_pais
@@ -555,7 +678,7 @@ BoxLayout:
         new_country = new_country.strip().upper()
         if new_country:
             from backend.file_manager import add_new_country
-            add_new_country(new_country)
+            self.ejecutar_en_segundo_plano(add_new_country, new_country)
             if context == "envio":
                 if new_country not in self.selected_envio_countries:
                     self.selected_envio_countries.append(new_country)
@@ -580,18 +703,41 @@ BoxLayout:
         except Exception as e:
             self.mostrar_dialogo("Error", "Datos ingresados no válidos")
             return
-        from backend.operations import check_duplicate_operation, add_envio_ui
-        if check_duplicate_operation(monto_float, paises_formateados, "envio"):
-            self._finalizar_guardado_envio(monto_float, paises_formateados)
-        else:
-            self._finalizar_guardado_envio(monto_float, paises_formateados)
+        from backend.operations import check_duplicate_operation
+        def continuar(duplicado):
+            guardar = lambda: self._finalizar_guardado_envio(monto_float, paises_formateados)
+            if duplicado:
+                self.confirmar_duplicado(f"Ya existe un envío de ${monto_float:,.2f} con los mismos países.", guardar)
+            else:
+                guardar()
+        self.ejecutar_en_segundo_plano(
+            check_duplicate_operation, monto_float, paises_formateados, "envio", on_done=continuar
+        )
+
+    def confirmar_duplicado(self, texto, guardar):
+        """Avisa que la operación parece repetida; sólo se guarda si el usuario lo confirma."""
+        def aceptar(*_):
+            self.dialog.dismiss()
+            guardar()
+        if self.dialog:
+            self.dialog.dismiss()
+        self.dialog = MDDialog(
+            title="Posible duplicado",
+            text=f"{texto}\n¿Deseas guardar igual?",
+            buttons=[
+                MDFlatButton(text="CANCELAR", on_release=lambda x: self.dialog.dismiss()),
+                MDFlatButton(text="GUARDAR", on_release=aceptar),
+            ],
+        )
+        self.dialog.open()
 
     def _finalizar_guardado_envio(self, monto, paises):
         from backend.operations import add_envio_ui
-        resultado = add_envio_ui(monto, paises)
-        self.mostrar_dialogo("¡Listo!", resultado)
-        self.reset_screen("add_envio")
-        self.root.current = "main_menu"
+        def terminar(resultado):
+            self.mostrar_dialogo("¡Listo!", resultado)
+            self.reset_screen("add_envio")
+            self.root.current = "main_menu"
+        self.ejecutar_en_segundo_plano(add_envio_ui, monto, paises, on_done=terminar, cargando="Guardando envío...")
 
     def guardar_recepcion(self, monto, paises_widgets):
         try:
@@ -601,18 +747,24 @@ BoxLayout:
         except Exception as e:
             self.mostrar_dialogo("Error", "Datos ingresados no válidos")
             return
-        from backend.operations import check_duplicate_operation, add_recepcion_ui
-        if check_duplicate_operation(monto_float, paises_formateados, "recepcion"):
-            self._finalizar_guardado_recepcion(monto_float, paises_formateados)
-        else:
-            self._finalizar_guardado_recepcion(monto_float, paises_formateados)
+        from backend.operations import check_duplicate_operation
+        def continuar(duplicado):
+            guardar = lambda: self._finalizar_guardado_recepcion(monto_float, paises_formateados)
+            if duplicado:
+                self.confirmar_duplicado(f"Ya existe una recepción de ${monto_float:,.2f} con los mismos países.", guardar)
+            else:
+                guardar()
+        self.ejecutar_en_segundo_plano(
+            check_duplicate_operation, monto_float, paises_formateados, "recepcion", on_done=continuar
+        )
 
     def _finalizar_guardado_recepcion(self, monto, paises):
         from backend.operations import add_recepcion_ui
-        resultado = add_recepcion_ui(monto, paises)
-        self.mostrar_dialogo("¡Listo!", resultado)
-        self.reset_screen("add_recepcion")
-        self.root.current = "main_menu"
+        def terminar(resultado):
+            self.mostrar_dialogo("¡Listo!", resultado)
+            self.reset_screen("add_recepcion")
+            self.root.current = "main_menu"
+        self.ejecutar_en_segundo_plano(add_recepcion_ui, monto, paises, on_done=terminar, cargando="Guardando recepción...")
 
     def reset_screen(self, screen_name):
         screen = self.root.get_screen(screen_name)
@@ -641,22 +793,89 @@ BoxLayout:
         Cambia a la pantalla swipe_matches, carga los envíos con sus recepciones candidatas,
         rota las tarjetas y actualiza el badge.
         """
-        from backend.operations import get_available_matches
-
         # 1) Cambiar pantalla
         self.root.current = "swipe_matches"
-        # 2) Obtener lista de bloques {envio, candidatas}
-        self.current_matches = get_available_matches()
-        # 3) Mostrar en tarjetas
-        self.rotar_cartas()
-        # 4) Actualizar indicador
-        self.update_badge_matches()
+        # 2) Obtener lista de bloques {envio, candidatas} en segundo plano
+        #    3) mostrarlos en tarjetas y 4) actualizar indicador
+        self.cargar_matches(on_done=lambda: self.update_badge_matches())
 
 
-    def cargar_matches(self):
-        from backend.operations import get_available_matches
-        self.current_matches = get_available_matches()
-        self.rotar_cartas()
+    _generacion_cola = 0
+    _rellenando_cola = False
+    _fin_de_cola = False
+    _cursor_cola = None
+
+    def _sin_confirmados(self, bloques, marca: int) -> list:
+        """
+        Quita de bloques pedidos cuando la última confirmación era `marca` los
+        envíos y recepciones confirmados después (ya no están DISPONIBLES).
+        """
+        recientes = [par for orden, par in self._confirmaciones.items() if orden > marca]
+        if not recientes:
+            return list(bloques)
+        envios = {e for e, _ in recientes}
+        recepciones = {r for _, r in recientes}
+        filtrados = []
+        for bloque in bloques:
+            if bloque["envio"]["id"] in envios:
+                continue
+            candidatas = [r for r in bloque["candidatas"] if r["id"] not in recepciones]
+            if len(candidatas) != len(bloque["candidatas"]):
+                bloque = dict(bloque, candidatas=candidatas)
+            if candidatas:
+                filtrados.append(bloque)
+        return filtrados
+
+    def cargar_matches(self, on_done=None):
+        """
+        Recarga completa de la cola de swipe: pide los primeros
+        PREFETCH_BLOQUES bloques (no se calculan los demás).
+        """
+        from backend.operations import preparar_bloques_swipe
+        swipe = self.root.get_screen("swipe_matches")
+        swipe.ids.label_central_card.text = "Cargando matches..."
+        # Las recargas en vuelo de una generación anterior se descartan
+        self._generacion_cola += 1
+        generacion = self._generacion_cola
+        marca = self._ultima_confirmacion
+        def mostrar(bloques):
+            if generacion != self._generacion_cola:
+                return
+            self.current_matches = deque(self._sin_confirmados(bloques, marca))
+            self._fin_de_cola = len(bloques) < PREFETCH_BLOQUES
+            self._cursor_cola = bloques[-1]["envio"]["id"] if bloques else None
+            self.rotar_cartas()
+            if on_done:
+                on_done()
+        self.ejecutar_en_segundo_plano(preparar_bloques_swipe, PREFETCH_BLOQUES, on_done=mostrar)
+
+    def _rellenar_cola(self):
+        """
+        Si quedan menos de PREFETCH_MINIMO bloques, pide en segundo plano los
+        siguientes (por keyset, después del último envío encolado).
+        """
+        from backend.operations import preparar_bloques_swipe
+        if self._rellenando_cola or self._fin_de_cola or len(self.current_matches) >= PREFETCH_MINIMO:
+            return
+        self._rellenando_cola = True
+        generacion = self._generacion_cola
+        marca = self._ultima_confirmacion
+        faltan = PREFETCH_BLOQUES - len(self.current_matches)
+        def agregar(bloques):
+            self._rellenando_cola = False
+            if generacion != self._generacion_cola:
+                return
+            vacia = not self.current_matches
+            encolados = {b["envio"]["id"] for b in self.current_matches}
+            self.current_matches.extend(
+                b for b in self._sin_confirmados(bloques, marca) if b["envio"]["id"] not in encolados
+            )
+            self._fin_de_cola = len(bloques) < faltan
+            if bloques:
+                self._cursor_cola = bloques[-1]["envio"]["id"]
+            if vacia and self.current_matches:
+                self.rotar_cartas()
+        self.ejecutar_en_segundo_plano(preparar_bloques_swipe, faltan, self._cursor_cola, on_done=agregar)
 
     def actualizar_matches(self):
         swipe_screen = self.root.get_screen("swipe_matches")
@@ -681,7 +900,7 @@ BoxLayout:
         swipe_screen.ids.central_card.opacity = 1
 
         # Tarjeta Superior: Mostrar la información de origen
-        candidates = self.current_matches[1:]
+        candidates = list(self.current_matches)[1:]
         if len(candidates) >= 1:
             candidate_top = candidates[0]
             top_text = (
@@ -727,31 +946,32 @@ BoxLayout:
             swipe.ids.label_central_card.text = "No hay envíos con candidatas 🎀"
             swipe.ids.central_card.opacity = 1
             swipe.ids.top_card.opacity = swipe.ids.bottom_card.opacity = 0
+            # Puede que queden envíos después del último encolado
+            self._rellenar_cola()
             return
 
         bloque = bloques[0]
         envio = bloque["envio"]
         recs  = bloque["candidatas"]
-        paises_e = fetch_paises_envio(envio["id"])
+        # Los textos de países vienen resueltos en la cola (sin consultar la BD)
 
         # — Central (envío) —
         swipe.ids.central_card.match_data = {"envio": envio}
         swipe.ids.label_central_card.text = (
             f"Envío ID: {envio['id']}\n"
             f"Monto: ${envio['monto']:.2f}\n"
-            f"Paises: {', '.join(sorted(paises_e))}"
+            f"Paises: {envio['paises_texto']}"
         )
         swipe.ids.central_card.opacity = 1
 
         # — Superior (recepción 1) —
         if len(recs) >= 1:
             r1 = recs[0]
-            comunes = paises_e & fetch_paises_recepcion(r1["id"])
             swipe.ids.top_card.match_data = {"recepcion": r1}
             swipe.ids.label_top_card.text = (
                 f"Recep. ID: {r1['id']}\n"
                 f"Monto: ${r1['monto']:.2f}\n"
-                f"Paises: {', '.join(sorted(comunes)) or 'N/A'}"
+                f"Paises: {r1['paises_comunes']}"
             )
             swipe.ids.top_card.opacity = 1
         else:
@@ -760,40 +980,129 @@ BoxLayout:
         # — Inferior (recepción 2) —
         if len(recs) >= 2:
             r2 = recs[1]
-            comunes = paises_e & fetch_paises_recepcion(r2["id"])
             swipe.ids.bottom_card.match_data = {"recepcion": r2}
             swipe.ids.label_bottom_card.text = (
                 f"Recep. ID: {r2['id']}\n"
                 f"Monto: ${r2['monto']:.2f}\n"
-                f"Paises: {', '.join(sorted(comunes)) or 'N/A'}"
+                f"Paises: {r2['paises_comunes']}"
             )
             swipe.ids.bottom_card.opacity = 1
         else:
             swipe.ids.bottom_card.opacity = 0
 
+        # Mantener la cola con bloques de reserva
+        self._rellenar_cola()
+
 
 
 
 
 
     def mostrar_seleccion_mes(self):
-        from kivymd.uix.menu import MDDropdownMenu
+        # Primero el año (los que tienen datos), después el mes
+        self.ejecutar_en_segundo_plano(operations.get_report_years, on_done=self._mostrar_seleccion_año)
+
+    def _mostrar_seleccion_año(self, años):
+        items = [{"text": str(año), "on_release": lambda x=año: self._mostrar_meses_de(x)} for año in años]
+        caller = self.root.get_screen("main_menu").ids.btn_pdf
+        self.menu_años = crear_dropdown_menu(caller, items)
+        Clock.schedule_once(lambda dt: center_menu(self.menu_años), 0.1)
+
+    def _mostrar_meses_de(self, año):
         spanish_months = [
             "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
             "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre",
         ]
-        meses = [{"text": f"{i:02d} - {spanish_months[i-1]}", "on_release": lambda x=i: self.generar_pdf_seleccionado(x)}
+        self.menu_años.dismiss()
+        meses = [{"text": f"{i:02d} - {spanish_months[i-1]} {año}",
+                  "on_release": lambda x=i: self.generar_pdf_seleccionado(x, año)}
                  for i in range(1, 13)]
         caller = self.root.get_screen("main_menu").ids.btn_pdf
         self.menu_meses = crear_dropdown_menu(caller, meses)
         Clock.schedule_once(lambda dt: setattr(self.menu_meses, "pos", ((Window.width - self.menu_meses.width) / 2,
                                                                          (Window.height - self.menu_meses.height) / 2)), 0.1)
 
-    def generar_pdf_seleccionado(self, mes):
-        from backend.operations import generate_pdf_report_ui
-        resultado = generate_pdf_report_ui(mes)
-        self.mostrar_dialogo("Resultado", resultado)
+    def generar_pdf_seleccionado(self, mes, año=None):
+        """
+        Pide el reporte al hilo de reportes y muestra su avance en la pantalla
+        PDFReport. Pedir de nuevo un mes que ya se está armando se une a ese trabajo.
+        """
         self.menu_meses.dismiss()
+        trabajo = report_worker.solicitar(mes, año, oyente=self._progreso_pdf)
+        if trabajo not in self._trabajos_pdf:
+            self._trabajos_pdf.append(trabajo)
+            trabajo.future.add_done_callback(
+                lambda f: Clock.schedule_once(lambda dt: self._resultado_pdf(trabajo, f))
+            )
+        screen = self.root.get_screen("pdf_report")
+        if trabajo.ultimo_avance is None:
+            screen.ids.lbl_progreso_pdf.text = f"Reporte {mes:02d}/{trabajo.año}: en cola..."
+        screen.ids.btn_cancelar_pdf.disabled = False
+        self.root.current = "pdf_report"
+
+    def _progreso_pdf(self, trabajo, etapa, valor):
+        # Llega desde el hilo de reportes
+        Clock.schedule_once(lambda dt: self._mostrar_progreso_pdf(trabajo, etapa, valor))
+
+    def _mostrar_progreso_pdf(self, trabajo, etapa, valor):
+        screen = self.root.get_screen("pdf_report")
+        titulo = f"Reporte {trabajo.mes:02d}/{trabajo.año}"
+        if etapa == "inicio":
+            screen.ids.barra_pdf.value = 0
+            screen.ids.lbl_progreso_pdf.text = f"{titulo}: consultando datos..."
+        elif etapa == "consulta":
+            screen.paginas_estimadas = valor or 1
+            screen.ids.lbl_progreso_pdf.text = f"{titulo}: datos listos, armando páginas..."
+        elif etapa == "pagina":
+            estimadas = max(screen.paginas_estimadas, valor)
+            screen.ids.barra_pdf.value = min(99, valor * 100 / estimadas)
+            screen.ids.lbl_progreso_pdf.text = f"{titulo}: página {valor} de ~{estimadas}"
+        elif etapa == "abriendo":
+            screen.ids.barra_pdf.value = 100
+            screen.ids.lbl_progreso_pdf.text = f"{titulo}: abriendo PDF..."
+
+    def _resultado_pdf(self, trabajo, future):
+        if trabajo in self._trabajos_pdf:
+            self._trabajos_pdf.remove(trabajo)
+        screen = self.root.get_screen("pdf_report")
+        screen.ids.btn_cancelar_pdf.disabled = not self._trabajos_pdf
+        if future.cancelled():
+            resultado = f"Reporte {trabajo.mes:02d}/{trabajo.año} cancelado."
+        else:
+            try:
+                resultado = future.result()
+            except Exception:
+                logger.exception("Error generando el reporte en segundo plano")
+                resultado = "Error al generar el PDF"
+        screen.ids.lbl_progreso_pdf.text = resultado
+        if not self._trabajos_pdf:
+            screen.ids.barra_pdf.value = 0
+        self.mostrar_dialogo("Resultado", resultado)
+
+    def cancelar_pdf(self):
+        report_worker.cancelar_todos()
+        self.root.get_screen("pdf_report").ids.lbl_progreso_pdf.text = "Cancelando..."
+
+    def abrir_importacion(self):
+        """Elige un CSV / JSON Lines para la carga masiva de operaciones."""
+        from kivymd.uix.filemanager import MDFileManager
+        if not getattr(self, "gestor_archivos", None):
+            self.gestor_archivos = MDFileManager(
+                exit_manager=lambda *args: self.gestor_archivos.close(),
+                select_path=self._importar_archivo,
+                ext=[".csv", ".jsonl", ".json"],
+            )
+        self.gestor_archivos.show(os.path.expanduser("~"))
+
+    def _importar_archivo(self, ruta):
+        from backend.importacion import importar_operaciones_ui
+        self.gestor_archivos.close()
+        def terminar(resultado):
+            self.mostrar_dialogo("Importación", resultado)
+            self.update_badge_matches()
+        self.ejecutar_en_segundo_plano(
+            importar_operaciones_ui, ruta, on_done=terminar, cargando="Importando operaciones..."
+        )
 
     def seleccionar_operacion(self, oper, tipo):
         """
@@ -888,16 +1197,21 @@ BoxLayout:
         if op_id is None:
             self.mostrar_dialogo("Error", "La operación seleccionada no tiene un ID válido.")
             return
-        resultado = modify_operacion_ui(op_id, nuevo_monto, nuevos_paises)
-        self.mostrar_dialogo("Resultado", resultado)
-        self.reset_modify_screen()
-        self.root.current = "main_menu"
+        def terminar(resultado):
+            self.mostrar_dialogo("Resultado", resultado)
+            self.reset_modify_screen()
+            self.root.current = "main_menu"
+        self.ejecutar_en_segundo_plano(
+            modify_operacion_ui, op_id, nuevo_monto, nuevos_paises,
+            on_done=terminar, cargando="Guardando cambios...",
+        )
         
     def update_badge_matches(self):
+        from backend.operations import count_available_matches
+        self.ejecutar_en_segundo_plano(count_available_matches, on_done=self._mostrar_badge_matches)
+
+    def _mostrar_badge_matches(self, count):
         try:
-            from backend.operations import get_available_matches
-            matches = get_available_matches()
-            count = len(matches)
             if not self.root or "main_menu" not in self.root.screen_names:
                 logger.warning("La pantalla 'main_menu' aún no está disponible para actualizar el badge.")
                 return
@@ -928,7 +1242,6 @@ BoxLayout:
         Descarta cualquier menú previo para evitar WidgetException.
         """
         from backend.operations import get_last_operations
-        from kivymd.uix.menu import MDDropdownMenu
         # Si ya hay un menú abierto, ciérralo antes
         if hasattr(self, "menu_operaciones") and self.menu_operaciones:
             try:
@@ -943,7 +1256,13 @@ BoxLayout:
                 pass
             self.menu_tipo_operaciones = None
 
-        operaciones = get_last_operations(tipo, limit=10)
+        self.ejecutar_en_segundo_plano(
+            get_last_operations, tipo, 10,
+            on_done=lambda operaciones: self._mostrar_operaciones_dropdown(tipo, operaciones),
+        )
+
+    def _mostrar_operaciones_dropdown(self, tipo, operaciones):
+        from kivymd.uix.menu import MDDropdownMenu
         if not operaciones:
             self.mostrar_dialogo("Info", f"No hay operaciones de {tipo} disponibles.")
             return
@@ -992,10 +1311,12 @@ BoxLayout:
 
     # Método para cargar los matches en la pantalla ManageMatches
     def cargar_matches_manage(self):
+        self.ejecutar_en_segundo_plano(operations.get_available_matches, on_done=self._mostrar_matches_manage)
+
+    def _mostrar_matches_manage(self, matches):
         screen = self.root.get_screen("manage_matches")
         lista = screen.ids.lista_matches
         lista.clear_widgets()
-        matches = operations.get_available_matches()
         for match in matches:
             # Crear un item con los detalles del match
             item = OneLineListItem(
@@ -1021,12 +1342,15 @@ BoxLayout:
             self.mostrar_dialogo("¡Uy, Onii-Chan!", "Por favor, selecciona un match primero.")
             return
         # Llamar a la función del backend para confirmar el match
-        result = operations.confirm_match_ui(self.match_seleccionado["MatchID"])
-        self.mostrar_dialogo("Confirmación", result)
-        # Limpiar la selección y actualizar la lista de matches
-        self.match_seleccionado = None
-        self.cargar_matches_manage()
-        self.update_badge_matches()
+        def terminar(result):
+            self.mostrar_dialogo("Confirmación", result)
+            # Limpiar la selección y actualizar la lista de matches
+            self.match_seleccionado = None
+            self.cargar_matches_manage()
+            self.update_badge_matches()
+        self.ejecutar_en_segundo_plano(
+            operations.confirm_match_ui, self.match_seleccionado["MatchID"], on_done=terminar
+        )
         
     def mostrar_matches_pendientes(self):
         """
@@ -1034,6 +1358,9 @@ BoxLayout:
         Permite 'Reactivar' o 'Concluir' sin salir de este diálogo.
         """
         from backend.operations import get_pending_matches
+        self.ejecutar_en_segundo_plano(get_pending_matches, on_done=self._mostrar_dialogo_pendientes)
+
+    def _mostrar_dialogo_pendientes(self, pending):
         from kivymd.uix.boxlayout import MDBoxLayout
         from kivymd.uix.scrollview import MDScrollView
         from kivymd.uix.list import ThreeLineIconListItem
@@ -1041,7 +1368,6 @@ BoxLayout:
         from kivymd.uix.dialog import MDDialog
         from kivymd.uix.button import MDFlatButton
 
-        pending = get_pending_matches()
         if not pending:
             self.mostrar_dialogo("Información", "No hay matches pendientes por cerrar.")
             return
@@ -1101,35 +1427,39 @@ BoxLayout:
 
     def _reactivar(self, match, dialog):
         from backend.operations import reactivate_pending
-        reactivate_pending(match['envio_id'], match['recepcion_id'])
         dialog.dismiss()
         self.dialog.dismiss()
-        # Refresca badge y tarjetas de swipe automáticamente
-        self.update_badge_matches()
-        self.cargar_matches()
-        self.rotar_cartas()
-        self.mostrar_dialogo("¡Listo!", "Match reactivado a utilizables.")
+        def terminar(_):
+            # Refresca badge y tarjetas de swipe automáticamente
+            self.update_badge_matches()
+            self.cargar_matches()
+            self.mostrar_dialogo("¡Listo!", "Match reactivado a utilizables.")
+        self.ejecutar_en_segundo_plano(
+            reactivate_pending, match['envio_id'], match['recepcion_id'], on_done=terminar
+        )
 
     def _concluir(self, match, dialog):
         from backend.operations import cerrar_match_ui
-        cerrar_match_ui(match['pending_id'])
         dialog.dismiss()
         self.dialog.dismiss()
-        # Refresca badge y tarjetas de swipe automáticamente
-        self.update_badge_matches()
-        self.cargar_matches()
-        self.rotar_cartas()
-        self.mostrar_dialogo("¡Listo!", "Match concluido y movido a concluidas.")
+        def terminar(_):
+            # Refresca badge y tarjetas de swipe automáticamente
+            self.update_badge_matches()
+            self.cargar_matches()
+            self.mostrar_dialogo("¡Listo!", "Match concluido y movido a concluidas.")
+        self.ejecutar_en_segundo_plano(cerrar_match_ui, match['pending_id'], on_done=terminar)
 
 
 
 
     def confirmar_cierre_match(self, match):
         # Se puede agregar aquí un diálogo de confirmación si lo deseas
-        result = operations.cerrar_match_ui(match["MatchID"])
-        self.mostrar_dialogo("Resultado", result)
         # Actualiza el listado de pending, refrescando el diálogo o la pantalla
         self.dialog.dismiss()
+        self.ejecutar_en_segundo_plano(
+            operations.cerrar_match_ui, match["MatchID"],
+            on_done=lambda result: self.mostrar_dialogo("Resultado", result),
+        )
         
     def show_match_confirmation(self, match_data):
         dialog = MDDialog(
@@ -1146,11 +1476,12 @@ BoxLayout:
     
     def confirm_match(self, match_data, dialog):
         from backend.operations import confirm_match_ui
-        result = confirm_match_ui(match_data["MatchID"])
-        self.mostrar_dialogo("Confirmación", result)  # Método ya definido para mostrar diálogos
         dialog.dismiss()
-        self.cargar_matches()          # Recarga los matches si tienes ese método
-        self.update_badge_matches()    # Actualiza el badge de matches
+        def terminar(result):
+            self.mostrar_dialogo("Confirmación", result)  # Método ya definido para mostrar diálogos
+            self.cargar_matches()          # Recarga los matches si tienes ese método
+            self.update_badge_matches()    # Actualiza el badge de matches
+        self.ejecutar_en_segundo_plano(confirm_match_ui, match_data["MatchID"], on_done=terminar)
 
 
     
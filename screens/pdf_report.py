@@ -1,4 +1,6 @@
+from kivy.properties import NumericProperty
 from kivy.uix.screenmanager import Screen
 
 class PDFReport(Screen):
-    pass
+    # Páginas que se espera que tenga el reporte en curso (para la barra)
+    paginas_estimadas = NumericProperty(1)
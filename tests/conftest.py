@@ -0,0 +1,51 @@
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+# La BD de pruebas se fija antes de importar backend: config lee el entorno
+# al importarse y get_database() abre ese archivo la primera vez.
+os.environ["GESTOR_DB_FILE"] = os.path.join(tempfile.mkdtemp(prefix="gestor-tests-"), "db.sqlite")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import operations  # noqa: E402
+
+_TABLAS = ("utilizables", "pendientes", "concluidas", "envio_paises",
+           "recepcion_paises", "envios", "recepciones")
+
+
+def _monto(rnd):
+    # Ceros, montos chicos (regla de ±10000) y montos grandes (regla del 60–140%)
+    return float(rnd.choice([0, rnd.randint(1, 300) * 100, rnd.randint(1, 60000), rnd.randint(1, 50) * 10000]))
+
+
+@pytest.fixture
+def poblar():
+    """
+    Devuelve poblar(envios, recepciones, paises, semilla): vacía las tablas,
+    carga operaciones DISPONIBLES al azar (de 1 a 3 países cada una) y
+    recarga el índice de matching.
+    """
+    def _poblar(envios: int, recepciones: int, paises: int, semilla: int = 1):
+        rnd = random.Random(semilla)
+        nombres = [f"PAIS{i:03d}" for i in range(paises)]
+        db = operations.db
+        with db.writer() as conn:
+            for tabla in _TABLAS:
+                conn.execute(f"DELETE FROM {tabla}")
+            for tabla, tabla_paises, fk, n in (("envios", "envio_paises", "envio_id", envios),
+                                               ("recepciones", "recepcion_paises", "recepcion_id", recepciones)):
+                for _ in range(n):
+                    cur = conn.execute(
+                        f"INSERT INTO {tabla} (monto, estado, fecha_hora) VALUES (?, 'DISPONIBLE', ?)",
+                        (_monto(rnd), f"2025-01-{rnd.randint(1, 28):02d} 10:00:00")
+                    )
+                    conn.executemany(
+                        f"INSERT INTO {tabla_paises} ({fk}, pais) VALUES (?, ?)",
+                        [(cur.lastrowid, p) for p in rnd.sample(nombres, rnd.randint(1, 3))]
+                    )
+            conn.commit()
+            operations.match_index.load(conn)
+    return _poblar
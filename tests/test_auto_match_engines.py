@@ -0,0 +1,27 @@
+import pytest
+
+from backend import operations
+
+
+def _utilizables():
+    with operations.db.reader() as conn:
+        return {
+            (r["envio_id"], r["recepcion_id"], r["monto_envio"], r["monto_recepcion"], r["diferencia"])
+            for r in conn.execute("SELECT * FROM utilizables")
+        }
+
+
+def _rescan(engine: str) -> set:
+    with operations.db.writer() as conn:
+        conn.execute("DELETE FROM utilizables")
+        conn.commit()
+    assert operations.auto_match_pairings(engine=engine) is not None
+    return _utilizables()
+
+
+@pytest.mark.parametrize("semilla, paises", [(1, 4), (2, 12), (3, 70)])
+def test_sql_igual_a_python(poblar, semilla, paises):
+    poblar(250, 250, paises, semilla)
+    python = _rescan("python")
+    assert python
+    assert _rescan("sql") == python
@@ -0,0 +1,94 @@
+import csv
+import json
+
+import pytest
+
+from backend import importacion, operations
+
+
+def _utilizables():
+    with operations.db.reader() as conn:
+        return {(r["envio_id"], r["recepcion_id"], r["diferencia"]) for r in conn.execute("SELECT * FROM utilizables")}
+
+
+def _rescan():
+    with operations.db.writer() as conn:
+        conn.execute("DELETE FROM utilizables")
+        conn.commit()
+    operations.auto_match_pairings()
+    return _utilizables()
+
+
+def _rechazos(resultado):
+    with open(resultado["rechazos"], newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_importar_csv(poblar, tmp_path):
+    poblar(40, 40, 6, semilla=7)
+    ruta = tmp_path / "ops.csv"
+    ruta.write_text(
+        "tipo,monto,paises,fecha_hora\n"
+        'envio,"1,500", pais000 ,2025-3-5 1:2:3\n'
+        'recepcion,1500,"pais000, PAIS001, pais000",\n'
+        "transferencia,100,PAIS000,\n"
+        "envio,abc,PAIS000,\n"
+        "recepcion,100,,\n"
+        "envio,100,PAIS001,05/03/2025\n",
+        encoding="utf-8",
+    )
+    r = importacion.importar_operaciones(str(ruta))
+    assert (r["importadas"], r["envios"], r["recepciones"], r["rechazadas"]) == (2, 1, 1, 4)
+
+    filas = _rechazos(r)
+    assert filas[0] == ["linea", "motivo", "fila"]
+    assert [f[0] for f in filas[1:]] == ["4", "5", "6", "7"]
+    assert filas[1][1].startswith("tipo inválido")
+    assert filas[2][1].startswith("monto inválido")
+    assert filas[3][1] == "sin países"
+    assert filas[4][1].startswith("fecha_hora inválida")
+
+    with operations.db.reader() as conn:
+        envio = conn.execute("SELECT * FROM envios ORDER BY id DESC LIMIT 1").fetchone()
+        recepcion = conn.execute("SELECT * FROM recepciones ORDER BY id DESC LIMIT 1").fetchone()
+    assert (envio["monto"], envio["paises"], envio["fecha_hora"]) == (1500.0, "PAIS000", "2025-03-05 01:02:03")
+    assert (recepcion["paises"], recepcion["paises_firma"]) == ("PAIS000,PAIS001", "PAIS000,PAIS001")
+
+    importadas = _utilizables()
+    assert (envio["id"], recepcion["id"], 0.0) in importadas
+    assert _rescan() == importadas
+
+
+def test_importar_jsonl(poblar, tmp_path):
+    poblar(60, 60, 10, semilla=8)
+    lineas = [
+        json.dumps({"tipo": "envio", "monto": 2500, "paises": ["PAIS002", "pais003"]}),
+        json.dumps({"monto": 2600, "paises": "PAIS003"}),
+        "",
+        "{no es json",
+        json.dumps([1, 2]),
+        json.dumps({"tipo": "envio", "monto": 10, "paises": 5}),
+        json.dumps({"tipo": "envio", "monto": 10, "paises": {"PAIS002": 1}}),
+        json.dumps({"tipo": "envio", "monto": 10, "paises": [None, "PAIS002"]}),
+        json.dumps({"tipo": "envio", "monto": 10, "paises": ["PAIS002", " "]}),
+    ]
+    ruta = tmp_path / "ops.jsonl"
+    ruta.write_text("\n".join(lineas) + "\n", encoding="utf-8")
+    r = importacion.importar_operaciones(str(ruta), tipo="recepcion")
+    assert (r["envios"], r["recepciones"], r["rechazadas"]) == (1, 1, 6)
+
+    filas = _rechazos(r)
+    assert [f[0] for f in filas[1:]] == ["4", "5", "6", "7", "8", "9"]
+    assert filas[1][2] == "{no es json"
+    assert filas[2][1] == "la línea no es un objeto JSON"
+    assert all(f[1].startswith("paises inválido") for f in filas[3:])
+
+    importadas = _utilizables()
+    assert r["matching"] is not None
+    assert _rescan() == importadas
+
+
+@pytest.mark.parametrize("paises", [5, 1.5, {"PAIS000": 1}, [None, "USA"], ["USA", ""], ["USA", 3]])
+def test_validar_rechaza_paises_mal_formados(paises):
+    with pytest.raises(importacion.FilaInvalida):
+        importacion._validar({"tipo": "envio", "monto": 10, "paises": paises})
@@ -0,0 +1,69 @@
+from backend import operations
+
+
+def _utilizables():
+    with operations.db.reader() as conn:
+        return {
+            (r["envio_id"], r["recepcion_id"], r["monto_envio"], r["monto_recepcion"], r["diferencia"])
+            for r in conn.execute("SELECT * FROM utilizables")
+        }
+
+
+def _rescan() -> set:
+    with operations.db.writer() as conn:
+        conn.execute("DELETE FROM utilizables")
+        conn.commit()
+    operations.auto_match_pairings()
+    return _utilizables()
+
+
+def _un_par():
+    envio_id, recepcion_id, *_ = min(_utilizables())
+    return envio_id, recepcion_id
+
+
+def test_incremental_igual_al_rescan_completo(poblar):
+    poblar(80, 80, 6, semilla=9)
+    operations.auto_match_pairings()
+
+    def paso(accion, *args):
+        accion(*args)
+        incremental = _utilizables()
+        assert incremental == _rescan(), accion.__name__
+
+    paso(operations.add_envio, 15000.0, "PAIS000, PAIS001")
+    paso(operations.add_recepcion, 14000.0, "pais001, PAIS002")
+    envio_id, _ = _un_par()
+    paso(operations.modify_operacion_ui, envio_id, "20000", "PAIS003, PAIS004")
+    paso(operations.modify_operacion_ui, envio_id, "", "PAIS005")
+    pendiente = _un_par()
+    paso(operations.marcar_pendiente, *pendiente)
+    paso(operations.reactivate_pending, *pendiente)
+    concluida = _un_par()
+    paso(operations.marcar_pendiente, *concluida)
+    paso(operations.cerrar_concluida, *concluida)
+
+
+def test_contador_igual_a_bloques_disponibles(poblar):
+    poblar(60, 60, 5, semilla=10)
+
+    def paso(accion, *args):
+        accion(*args)
+        assert operations.count_available_matches() == len(operations.get_available_matches()), accion.__name__
+
+    def invalidar(envio_id, recepcion_id):
+        with operations.db.writer() as conn:
+            operations.invalidar_utilizables(conn.cursor(), envio_ids=[envio_id], recepcion_ids=[recepcion_id])
+            conn.commit()
+
+    operations.auto_match_pairings()
+    assert operations.count_available_matches() == len(operations.get_available_matches())
+    paso(operations.add_envio, 30000.0, "PAIS000")
+    paso(operations.add_recepcion, 31000.0, "PAIS000, PAIS004")
+    envio_id, _ = _un_par()
+    paso(operations.modify_operacion_ui, envio_id, "5", "PAIS001")
+    paso(operations.marcar_pendiente, *_un_par())
+    paso(invalidar, *_un_par())
+    cerrada = _un_par()
+    paso(operations.marcar_pendiente, *cerrada)
+    paso(operations.cerrar_concluida, *cerrada)
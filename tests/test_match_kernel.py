@@ -0,0 +1,59 @@
+import pytest
+
+from backend import match_kernel
+from backend.operations import get_match_index, recorrer_matches
+
+
+def _ids(pares):
+    return [(e["id"], [r["id"] for r in recepciones]) for e, recepciones in pares]
+
+
+@pytest.mark.parametrize("limite", [None, 2])
+@pytest.mark.parametrize("semilla, paises", [(1, 5), (2, 80)])
+def test_numpy_igual_a_python(poblar, semilla, paises, limite):
+    pytest.importorskip("numpy")
+    # Con 80 países las máscaras ocupan dos palabras de 64 bits
+    poblar(300, 300, paises, semilla)
+    esperado = _ids(recorrer_matches(limite=limite, kernel="python"))
+    assert esperado
+    assert _ids(recorrer_matches(limite=limite, kernel="numpy")) == esperado
+
+
+def test_numpy_igual_a_python_desde_id(poblar):
+    pytest.importorskip("numpy")
+    poblar(200, 200, 70, semilla=3)
+    esperado = _ids(recorrer_matches(limite=2, kernel="python", desde_id=100))
+    assert _ids(recorrer_matches(limite=2, kernel="numpy", desde_id=100)) == esperado
+
+
+def test_sin_numpy_se_usa_python(poblar, monkeypatch):
+    poblar(150, 150, 70, semilla=4)
+    esperado = _ids(recorrer_matches(kernel="python"))
+    monkeypatch.setattr(match_kernel, "np", None)
+    assert not match_kernel.usar_numpy("numpy")
+    assert _ids(recorrer_matches(kernel="numpy")) == esperado
+    assert _ids(recorrer_matches(limite=2, kernel="numpy")) == _ids(recorrer_matches(limite=2, kernel="python"))
+
+
+def test_auto_usa_el_indice_salvo_que_numpy_convenga(poblar, monkeypatch):
+    monkeypatch.setattr(match_kernel, "np", object())
+    assert not match_kernel.usar_numpy("auto")
+    assert match_kernel.usar_numpy("numpy", completo=False)
+    # Carga densa: pocos países, muchos pares por envío
+    poblar(300, 300, 3, semilla=5)
+    densa = get_match_index().estimar_rescan()
+    assert densa["palabras"] == 1
+    assert match_kernel.usar_numpy("auto", estimacion=densa)
+    assert not match_kernel.usar_numpy("auto", completo=False, estimacion=densa)
+
+
+def test_auto_usa_el_indice_en_cargas_anchas_y_dispersas(poblar, monkeypatch):
+    monkeypatch.setattr(match_kernel, "np", object())
+    # 2000 países: máscaras de varias palabras y casi ningún par por envío
+    poblar(300, 300, 2000, semilla=6)
+    dispersa = get_match_index().estimar_rescan()
+    assert dispersa["palabras"] > 8
+    assert dispersa["pares_por_envio"] < 1
+    assert not match_kernel.conviene_numpy(dispersa)
+    assert not match_kernel.usar_numpy("auto", estimacion=dispersa)
+    assert match_kernel.usar_numpy("numpy", estimacion=dispersa)
@@ -0,0 +1,44 @@
+import pytest
+
+from backend import config, match_parallel, operations
+
+
+def _ids(pares):
+    return [(e["id"], [r["id"] for r in recepciones]) for e, recepciones in pares]
+
+
+def _utilizables():
+    with operations.db.reader() as conn:
+        return {
+            (r["envio_id"], r["recepcion_id"], r["monto_envio"], r["monto_recepcion"], r["diferencia"])
+            for r in conn.execute("SELECT * FROM utilizables")
+        }
+
+
+def _rescan(workers: int) -> set:
+    with operations.db.writer() as conn:
+        conn.execute("DELETE FROM utilizables")
+        conn.commit()
+    operations.auto_match_pairings(engine="python", workers=workers)
+    return _utilizables()
+
+
+@pytest.mark.parametrize("kernel", ["python", "numpy"])
+def test_paralelo_igual_a_secuencial(poblar, monkeypatch, kernel):
+    if kernel == "numpy":
+        pytest.importorskip("numpy")
+    poblar(200, 200, 8, semilla=11)
+    monkeypatch.setattr(config, "MATCH_PARALLEL_MIN", 10)
+    monkeypatch.setattr(config, "MATCH_KERNEL", kernel)
+    llamadas = []
+    recorrer = match_parallel.recorrer
+    monkeypatch.setattr(match_parallel, "recorrer", lambda *a, **k: llamadas.append(a) or recorrer(*a, **k))
+
+    secuencial = _ids(operations.recorrer_matches(workers=1))
+    assert secuencial
+    assert not llamadas
+    assert _ids(operations.recorrer_matches(workers=2)) == secuencial
+    assert llamadas
+
+    utilizables = _rescan(workers=1)
+    assert _rescan(workers=2) == utilizables